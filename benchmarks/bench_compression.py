@@ -0,0 +1,76 @@
+"""Benchmark compression codecs of cache files
+
+Reports write time, read time and on-disk size for each file type and codec.
+
+Usage:
+    python benchmarks/bench_compression.py --rows 1000000 --cols 20
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+from bench_hash import make_frame
+
+from dutil.pipeline._cached import _cached_load, _cached_save
+
+CODECS = [
+    (None, None),
+    ("snappy", None),
+    ("lz4", None),
+    ("zstd", 1),
+    ("zstd", 3),
+    ("zstd", 9),
+    ("gzip", 6),
+]
+FTYPE_CODECS = {
+    "pickle": CODECS,
+    "parquet": CODECS,
+    "arrow": [c for c in CODECS if c[0] in (None, "lz4", "zstd")],
+}
+
+
+def benchmark(df: pd.DataFrame, folder: Path) -> pd.DataFrame:
+    records = []
+    for ftype, codecs in FTYPE_CODECS.items():
+        for compression, level in codecs:
+            path = folder / f"data_{compression}_{level}.{ftype}"
+            start = time.perf_counter()
+            _cached_save(df, ftype, path, compression, level)
+            write_time = time.perf_counter() - start
+            start = time.perf_counter()
+            _cached_load(ftype, path, compression)
+            read_time = time.perf_counter() - start
+            records.append(
+                {
+                    "ftype": ftype,
+                    "compression": compression,
+                    "level": level,
+                    "write_s": write_time,
+                    "read_s": read_time,
+                    "size_mb": path.stat().st_size / 1e6,
+                }
+            )
+            path.unlink()
+    return pd.DataFrame(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--cols", type=int, default=20)
+    parser.add_argument("--folder", type=str, default=None, help="e.g. the NFS cache folder")
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.cols)
+    print(f"frame: {args.rows:,} rows x {args.cols} cols")
+    with tempfile.TemporaryDirectory(dir=args.folder) as folder:
+        results = benchmark(df, Path(folder))
+    with pd.option_context("display.width", 120, "display.float_format", "{:.3f}".format):
+        print(results.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
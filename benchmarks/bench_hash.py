@@ -0,0 +1,94 @@
+"""Benchmark DataFrame hashing used to build cache names
+
+Compares the previous column-by-column hashing (string digests + `str()` fallback)
+with the current vectorized implementation of `dutil.pipeline._cached._hash_obj`.
+
+Usage:
+    python benchmarks/bench_hash.py --rows 10000000 --cols 200
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import xxhash
+
+from dutil.pipeline._cached import _hash_obj
+
+
+def _legacy_hash_ndarray(arr: np.ndarray) -> str:
+    hasher = xxhash.xxh64(seed=42)
+    try:
+        data = arr if np.issubdtype(arr.dtype, np.number) else str(arr)
+    except TypeError:
+        data = str(arr)
+    try:
+        hasher.update(data)
+    except ValueError:
+        hasher.update(str(arr))
+    return str(hasher.intdigest())
+
+
+def _legacy_hash_df(df: pd.DataFrame) -> str:
+    h = "".join(_legacy_hash_ndarray(df[c].values) for c in df)
+    return str(xxhash.xxh64_intdigest(h, seed=42))
+
+
+def make_frame(rows: int, cols: int, seed: int = 0) -> pd.DataFrame:
+    """Mostly numeric frame with a few string, datetime and categorical columns"""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(cols):
+        kind = i % 20
+        if kind == 17:  # column 17 is a string column
+            data[f"s{i}"] = rng.integers(0, 1000, rows).astype(str).astype(object)
+        elif kind == 18:
+            data[f"t{i}"] = pd.Timestamp("2020-01-01") + pd.to_timedelta(
+                rng.integers(0, 10**6, rows), unit="s"
+            )
+        elif kind == 19:
+            data[f"c{i}"] = pd.Categorical.from_codes(
+                rng.integers(0, 10, rows), list("abcdefghij")
+            )
+        else:
+            data[f"f{i}"] = rng.random(rows)
+    return pd.DataFrame(data)
+
+
+def _time(f, df, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f(df)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--cols", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.cols)
+    size_gb = df.memory_usage(deep=False).sum() / 1e9
+    print(f"frame: {args.rows:,} rows x {args.cols} cols ({size_gb:.2f} GB)")
+    t_legacy = _time(_legacy_hash_df, df, args.repeat)
+    t_new = _time(_hash_obj, df, args.repeat)
+    print(f"legacy:     {t_legacy:8.3f} s  (abbreviated str() for non-numeric columns)")
+    print(f"vectorized: {t_new:8.3f} s  ({size_gb / t_new:.2f} GB/s)")
+    print(f"speedup:    {t_legacy / t_new:8.2f}x")
+
+    changed = df.copy()
+    changed.iloc[args.rows // 2, 17] = "changed"  # a string column
+    print(
+        "one changed string detected: legacy={}, vectorized={}".format(
+            _legacy_hash_df(df) != _legacy_hash_df(changed), _hash_obj(df) != _hash_obj(changed)
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
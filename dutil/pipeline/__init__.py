@@ -2,10 +2,21 @@
 Data persistance and pipelining tools
 """
 
-from dutil.pipeline._cached import CachedResultItem, cached, clear_cache  # noqa: F401
+from dutil.pipeline._cached import (  # noqa: F401
+    CachedResultItem,
+    MemoryCache,
+    cached,
+    clear_cache,
+    register_hasher,
+    reshard_cache,
+    wait_for_writes,
+)
+from dutil.pipeline._catalog import CacheCatalog  # noqa: F401
 from dutil.pipeline._dask import (  # noqa: F401
     DelayedParameter,
     DelayedParameters,
+    ExecutionPlan,
     delayed_cached,
     delayed_compute,
+    explain,
 )
@@ -1,72 +1,502 @@
 from __future__ import annotations
 
+import dataclasses
+import datetime as dt
+import enum
 import functools
+import heapq
+import inspect
+import io
 import json
-import multiprocessing
+import os
 import shutil
-from pathlib import Path
-from typing import Any, Callable, Optional, Union
+import struct
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import wait as _wait_futures
+from contextlib import contextmanager
+from pathlib import Path, PurePath
+from typing import Any, Callable, Iterable, Iterator, Optional, Union
 
 import dill
 
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
 # from contextlib import contextmanager
 # from contextvars import ContextVar
 import numpy as np
 import pandas as pd
 import pyarrow
+import pyarrow.ipc
+import pyarrow.parquet
 import xxhash
 from dask.delayed import Delayed
+from dask.sizeof import sizeof
 from loguru import logger as _logger
 
+from dutil.pipeline._catalog import (
+    CATALOG_FILE_NAME,
+    CacheCatalog,
+    _close_catalogs,
+    _get_catalog,
+)
+from dutil.pipeline._filelock import FileLock
+
 _ = pyarrow.__version__  # set pyarrow dependency explicitly
 
-xxhasher = xxhash.xxh64(seed=42)
+HASH_SEED = 42
 
 MAX_ARG_HASH_LEN = 32  # limit length of hash string
 MAX_NAME_LEN = 240  # limit length of cache file name (not counting file extention)
+HASH_MEMO = False  # memoize hashes of large arguments by identity (in-place edits are not seen)
+HASH_MEMO_MAX_ITEMS = 256  # max number of memoized hashes of large arguments
+HASH_MEMO_MIN_SIZE = 100_000  # memoize hashes of arrays / frames with at least so many elements
+HASH_PARALLEL_MIN_SIZE = 1_000_000  # hash columns of larger frames on a thread pool
+HASH_MAX_WORKERS = min(32, os.cpu_count() or 1)
+COMPRESSION_BLOCK_SIZE = 4 * 2**20  # block size of compressed pickle / npy files
+WRITE_BEHIND_MAX_WORKERS = 4  # threads writing caches in the background
+IO_MAX_WORKERS = 8  # parallel reads / writes of the files of one cache (multiple outputs)
+PREFETCH_MAX_WORKERS = 4  # threads loading caches ahead of use (`cached(read_ahead=True)`)
+MEMORY_SAMPLE_SECONDS = 0.01  # resident memory sampling interval while a function runs
+QUOTA_RESCAN_SECONDS = 600  # re-read sizes of a size-limited cache folder this often
+SHARD_WIDTH = 2  # hex characters of the name hash per shard directory level
+MAX_SHARD_LEVELS = 8
+LINEAGE_DIR_NAME = ".lineage"  # aliases: lineage key of a call -> cache name (graph pruning)
+
+_BLOCK_HEADER = struct.Struct("<QQ")
+_LEN = struct.Struct("<Q")
+_FLOAT = struct.Struct("<d")
+
+# arguments of these types are shown as they are in cache names (str is canonical)
+_READABLE_TYPES = (type(None), bool, int, float, str, dt.date, dt.time, dt.timedelta, PurePath)
+
+
+def _hash_elements(values) -> np.ndarray:
+    """Hash array-like values element-wise (vectorized) into a uint64 array
+
+    Used for values without a raw numeric buffer: objects, strings, categoricals, etc.
+    Scalar elements of object arrays are hashed by their string form, so the type of each
+    element is mixed in (e.g. 1 and "1" differ), except for arrays of strings only.
+    Other elements (arrays, frames, containers) are hashed in full with `_hash_obj`
+    (their string form may be abbreviated).
+    """
+    if (
+        not isinstance(values, np.ndarray)
+        or values.dtype != object
+        or pd.api.types.infer_dtype(values, skipna=False) == "string"
+    ):
+        return _hash_element_values(values)
+    types = np.fromiter(
+        (f"{type(v).__module__}.{type(v).__qualname__}" for v in values),
+        dtype=object,
+        count=len(values),
+    )
+    nested = [i for i, v in enumerate(values) if not pd.api.types.is_scalar(v)]
+    if nested:
+        values = values.copy()
+        for i in nested:
+            values[i] = _hash_obj(values[i], max_len=None)
+    hashes = _hash_element_values(values)
+    return hashes ^ (pd.util.hash_array(types) * np.uint64(0x9E3779B97F4A7C15))
 
 
-def _hash_ndarray(arr: np.ndarray):
+def _hash_element_values(values) -> np.ndarray:
     try:
-        data = arr if np.issubdtype(arr.dtype, np.number) else str(arr)
-    except TypeError:  # numpy cannot determine data type
-        data = str(arr)
+        return pd.util.hash_array(values)
+    except TypeError:  # unhashable elements (e.g. lists) cannot be categorized
+        pass
     try:
-        xxhasher.update(data)
-    except ValueError:  # cannot hash M-type array
-        data = str(arr)
-        xxhasher.update(data)
-    h = str(xxhasher.intdigest())
-    xxhasher.reset()
-    return h
+        return pd.util.hash_array(values, categorize=False)
+    except (TypeError, ValueError):  # elements pandas cannot cast to str as an array
+        values = np.fromiter((str(v) for v in values), dtype=object, count=len(values))
+        return pd.util.hash_array(values, categorize=False)
 
 
-def _hash_obj(obj, max_len: Optional[int] = MAX_ARG_HASH_LEN) -> str:
+def _values_digest(values) -> int:
+    """Digest of 1-d array values
+
+    Raw buffers are hashed for numeric, boolean and datetime numpy arrays;
+    other values (incl. extension arrays) are hashed element-wise.
+    """
+    if isinstance(values, np.ndarray) and not values.dtype.hasobject:
+        buffer = np.ascontiguousarray(values).reshape(-1).view(np.uint8)
+    else:
+        buffer = _hash_elements(values)
+    return xxhash.xxh64_intdigest(buffer, seed=HASH_SEED)
+
+
+def _index_digest(index: pd.Index) -> int:
+    if isinstance(index, pd.RangeIndex):
+        return xxhash.xxh64_intdigest(repr((index.start, index.stop, index.step)), seed=HASH_SEED)
+    elif isinstance(index, pd.MultiIndex):
+        return xxhash.xxh64_intdigest(
+            pd.util.hash_pandas_object(index, index=False).to_numpy(), seed=HASH_SEED
+        )
+    else:
+        return _values_digest(index.values)
+
+
+def _combine_digests(header: str, digests: list[int]) -> str:
+    buffer = header.encode() + np.array(digests, dtype=np.uint64).tobytes()
+    return str(xxhash.xxh64_intdigest(buffer, seed=HASH_SEED))
+
+
+_hash_executor: Optional[ThreadPoolExecutor] = None
+_hash_executor_lock = threading.Lock()
+
+
+def _get_hash_executor() -> ThreadPoolExecutor:
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is None:
+            _hash_executor = ThreadPoolExecutor(
+                max_workers=HASH_MAX_WORKERS, thread_name_prefix="dutil-hash"
+            )
+        return _hash_executor
+
+
+def _hash_ndarray(arr: np.ndarray) -> str:
+    """Hash array values, dtype and shape"""
+    values = arr.reshape(-1) if arr.dtype.hasobject else arr
+    return _combine_digests(repr((arr.dtype.str, arr.shape)), [_values_digest(values)])
+
+
+def _hash_pandas(obj: Union[pd.Series, pd.DataFrame]) -> str:
+    """Hash values, dtypes, labels and index of a Series or a DataFrame
+
+    Each column is hashed in one vectorized pass over its values
+    (no string conversion of numeric data), column digests are combined with the labels.
+    Columns of large frames are hashed in parallel (xxhash releases the GIL).
+    """
+    columns = list(obj.items()) if isinstance(obj, pd.DataFrame) else [(obj.name, obj)]
+    header = repr(
+        (
+            type(obj).__name__,
+            [(k, str(s.dtype)) for k, s in columns],
+            list(obj.index.names),
+            str(obj.index.dtype),
+        )
+    )
+    values = [s.values for _, s in columns]
+    if len(values) > 1 and obj.size >= HASH_PARALLEL_MIN_SIZE:
+        value_digests = list(_get_hash_executor().map(_values_digest, values))
+    else:
+        value_digests = [_values_digest(v) for v in values]
+    return _combine_digests(header, [_index_digest(obj.index)] + value_digests)
+
+
+def _buffer_address(values) -> int:
+    if isinstance(values, np.ndarray):
+        return values.__array_interface__["data"][0]
+    else:
+        return id(values)
+
+
+def _fingerprint(obj: Union[np.ndarray, pd.Series, pd.DataFrame]) -> tuple:
+    """Cheap fingerprint of an array / frame: shape, dtypes, labels and buffer addresses"""
     if isinstance(obj, np.ndarray):
-        h = _hash_ndarray(obj)
+        return (obj.shape, obj.dtype.str, obj.strides, _buffer_address(obj))
     elif isinstance(obj, pd.Series):
-        # try:
-        #     xxhasher.update(obj.values)
-        # except (TypeError, ValueError):
-        #     xxhasher.update(str(obj.values))
-        h = _hash_ndarray(obj.values)
-    elif isinstance(obj, pd.DataFrame):
-        h_ = ""
-        for c in obj:
-            # try:
-            #     xxhasher.update(obj[c].values)
-            # except (TypeError, ValueError):
-            #     xxhasher.update(str(obj[c].values))
-            h_ = h_ + _hash_ndarray(obj[c].values)
-        xxhasher.update(h_)
-        h = str(xxhasher.intdigest())
-        xxhasher.reset()
+        return (obj.shape, str(obj.dtype), obj.name, id(obj.index), _buffer_address(obj.values))
     else:
+        return (
+            obj.shape,
+            id(obj.index),
+            tuple((k, str(s.dtype), _buffer_address(s.values)) for k, s in obj.items()),
+        )
+
+
+class _HashMemo:
+    """Process-wide memo of hashes of large arguments keyed by object identity
+
+    Only weak references to the hashed objects are kept: an entry is dropped
+    once its object is garbage collected. A cheap fingerprint guards against replaced data
+    (new shape, dtypes, columns or buffers), but in-place changes of values
+    (e.g. `df.iloc[0, 0] = 1`) are not detected: a stale hash is a false cache hit.
+    Hence only used if `HASH_MEMO` is set, for arguments that are never modified in place.
+    """
+
+    def __init__(self, max_items: int, min_size: int):
+        self.max_items = max_items
+        self.min_size = min_size
+        self._entries: OrderedDict[int, tuple[weakref.ref, tuple, str]] = OrderedDict()
+        self._lock = threading.RLock()  # weakref callbacks may fire while the lock is held
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, obj) -> Optional[str]:
+        if obj.size < self.min_size:
+            return None
+        with self._lock:
+            entry = self._entries.get(id(obj))
+            if entry is None:
+                return None
+            ref, fingerprint, h = entry
+            if ref() is not obj or fingerprint != _fingerprint(obj):
+                del self._entries[id(obj)]
+                return None
+            self._entries.move_to_end(id(obj))
+            return h
+
+    def put(self, obj, h: str) -> None:
+        if obj.size < self.min_size:
+            return
+        key = id(obj)
+        ref = weakref.ref(obj, lambda r: self._discard(key, r))
+        with self._lock:
+            self._entries[key] = (ref, _fingerprint(obj), h)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def _discard(self, key: int, ref: weakref.ref) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is ref:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_hash_memo = _HashMemo(max_items=HASH_MEMO_MAX_ITEMS, min_size=HASH_MEMO_MIN_SIZE)
+
+
+_hashers: dict[Union[type, str], Callable[[Any], str]] = {}
+_hasher_cache: dict[type, Optional[Callable[[Any], str]]] = {}  # type -> hasher (incl. bases)
+
+
+def register_hasher(cls: Union[type, str], fn: Callable[[Any], str]) -> None:
+    """Register a function hashing objects of a type (and its subclasses) for cache names
+
+    :param cls: type or its full name 'module.QualName' - no import is required
+        for optional dependencies (e.g. 'polars.dataframe.frame.DataFrame')
+    :param fn: function returning a digest of an object (str),
+        equal digests must imply equal data
+    """
+    _hashers[cls] = fn
+    _hasher_cache.clear()
+
+
+def _get_hasher(obj) -> Optional[Callable[[Any], str]]:
+    cls = type(obj)
+    try:
+        return _hasher_cache[cls]
+    except KeyError:
+        pass
+    hasher = None
+    for base in cls.__mro__:
+        hasher = _hashers.get(base) or _hashers.get(f"{base.__module__}.{base.__qualname__}")
+        if hasher is not None:
+            break
+    _hasher_cache[cls] = hasher
+    return hasher
+
+
+def _update_arrow_array(h: xxhash.xxh64, arr: Union[pyarrow.Array, pyarrow.ChunkedArray]) -> None:
+    chunks = arr.chunks if isinstance(arr, pyarrow.ChunkedArray) else [arr]
+    for chunk in chunks:
+        _update_bytes(h, b"A", repr((str(chunk.type), len(chunk), chunk.offset)).encode())
+        for buffer in chunk.buffers():
+            if buffer is None:
+                h.update(b"N")
+            else:
+                h.update(_LEN.pack(buffer.size))
+                h.update(buffer)
+        if isinstance(chunk, pyarrow.DictionaryArray):
+            _update_arrow_array(h, chunk.dictionary)
+
+
+def _hash_arrow(obj: Union[pyarrow.Table, pyarrow.RecordBatch, pyarrow.Array]) -> str:
+    """Hash raw buffers of an arrow table / record batch / array (and column names, types)"""
+    h = xxhash.xxh64(seed=HASH_SEED)
+    if isinstance(obj, (pyarrow.Table, pyarrow.RecordBatch)):
+        _update_bytes(h, b"S", repr([(f.name, str(f.type)) for f in obj.schema]).encode())
+        for column in obj.columns:
+            _update_arrow_array(h, column)
+    else:
+        _update_arrow_array(h, obj)
+    return str(h.intdigest())
+
+
+def _hash_pandas_index(index: pd.Index) -> str:
+    return _combine_digests(
+        repr((type(index).__name__, list(index.names), str(index.dtype))), [_index_digest(index)]
+    )
+
+
+def _hash_categorical(cat: pd.Categorical) -> str:
+    return _combine_digests(
+        repr(("Categorical", cat.ordered, str(cat.categories.dtype))),
+        [_values_digest(cat.codes), _index_digest(cat.categories)],
+    )
+
+
+def _hash_polars(obj) -> str:
+    return _hash_arrow(obj.to_arrow())
+
+
+def _hash_sparse(obj) -> str:
+    """Hash a scipy sparse matrix / array in the canonical CSR format"""
+    m = obj.tocsr()
+    if not m.has_canonical_format:
+        m = m.copy() if m is obj else m
+        m.sum_duplicates()  # also sorts indices
+    return _combine_digests(
+        repr(("sparse", m.shape, m.dtype.str)),
+        [_values_digest(m.data), _values_digest(m.indices), _values_digest(m.indptr)],
+    )
+
+
+def _hash_xarray_variable(var) -> str:
+    return _combine_digests(
+        repr(("Variable", var.dims, _hash_structure(dict(var.attrs)))),
+        [int(_hash_obj(np.asarray(var.values), max_len=None))],
+    )
+
+
+def _hash_xarray(obj) -> str:
+    """Hash an xarray DataArray / Dataset: variables, coordinates, names and attributes"""
+    variables = {"name": getattr(obj, "name", None), "attrs": dict(obj.attrs)}
+    if hasattr(obj, "data_vars"):
+        variables["data"] = {
+            k: _hash_xarray_variable(v.variable) for k, v in obj.data_vars.items()
+        }
+    else:
+        variables["data"] = _hash_xarray_variable(obj.variable)
+    variables["coords"] = {k: _hash_xarray_variable(v.variable) for k, v in obj.coords.items()}
+    return _hash_structure(variables)
+
+
+for _cls, _fn in [
+    (pyarrow.Table, _hash_arrow),
+    (pyarrow.RecordBatch, _hash_arrow),
+    (pyarrow.Array, _hash_arrow),
+    (pyarrow.ChunkedArray, _hash_arrow),
+    (pd.Index, _hash_pandas_index),
+    (pd.Categorical, _hash_categorical),
+    ("polars.dataframe.frame.DataFrame", _hash_polars),
+    ("polars.series.series.Series", _hash_polars),
+    ("scipy.sparse._base._spbase", _hash_sparse),
+    ("scipy.sparse.base.spmatrix", _hash_sparse),
+    ("xarray.core.dataarray.DataArray", _hash_xarray),
+    ("xarray.core.dataset.Dataset", _hash_xarray),
+]:
+    register_hasher(_cls, _fn)
+
+
+def _update_bytes(h: xxhash.xxh64, tag: bytes, data: bytes) -> None:
+    h.update(tag)
+    h.update(_LEN.pack(len(data)))
+    h.update(data)
+
+
+def _type_name(obj) -> bytes:
+    return "{}.{}".format(type(obj).__module__, type(obj).__qualname__).encode()
+
+
+def _update_unordered(h: xxhash.xxh64, tag: bytes, items: list, seen: set) -> None:
+    """Hash items independently and combine their sorted digests (order does not matter)"""
+    digests = []
+    for item in items:
+        item_h = xxhash.xxh64(seed=HASH_SEED)
+        _update_hash(item_h, item, seen)
+        digests.append(item_h.intdigest())
+    _update_bytes(h, tag, np.sort(np.array(digests, dtype=np.uint64)).tobytes())
+
+
+def _update_hash(h: xxhash.xxh64, obj, seen: set) -> None:
+    """Feed a canonical representation of an object into a streaming hash
+
+    Containers are traversed recursively: dicts and sets do not depend on the order of items,
+    dataclasses and plain objects are hashed by their fields, not by their `repr`.
+    """
+    if hasattr(obj, "__cached_hash__"):
+        _update_bytes(h, b"c", str(obj.__cached_hash__()).encode())
+    elif obj is None:
+        h.update(b"N")
+    elif isinstance(obj, enum.Enum):
+        _update_bytes(h, b"E", _type_name(obj) + b"." + obj.name.encode())
+    elif isinstance(obj, np.generic):
+        _update_bytes(h, b"n", obj.dtype.str.encode() + b":" + obj.tobytes())
+    elif isinstance(obj, bool):
+        h.update(b"T" if obj else b"F")
+    elif isinstance(obj, int):
+        _update_bytes(h, b"i", obj.to_bytes(obj.bit_length() // 8 + 1, "little", signed=True))
+    elif isinstance(obj, float):
+        _update_bytes(h, b"f", _FLOAT.pack(obj))
+    elif isinstance(obj, str):
+        _update_bytes(h, b"s", obj.encode("utf-8", "surrogatepass"))
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        _update_bytes(h, b"b", bytes(obj))
+    elif isinstance(obj, (dt.date, dt.time, dt.timedelta)):
+        _update_bytes(h, b"t", _type_name(obj) + b":" + str(obj).encode())
+    elif isinstance(obj, PurePath):
+        _update_bytes(h, b"p", str(obj).encode())
+    elif isinstance(obj, (np.ndarray, pd.Series, pd.DataFrame)):
+        _update_bytes(h, b"a", _hash_obj(obj, max_len=None).encode())
+    elif _get_hasher(obj) is not None:
+        _update_bytes(h, b"h", _type_name(obj) + b":" + _get_hasher(obj)(obj).encode())
+    elif id(obj) in seen:  # recursive container
+        h.update(b"R")
+    elif isinstance(obj, (list, tuple, dict, set, frozenset)) or dataclasses.is_dataclass(obj):
+        seen.add(id(obj))
+        if isinstance(obj, (list, tuple)):
+            _update_bytes(h, b"l" if isinstance(obj, list) else b"u", _LEN.pack(len(obj)))
+            for item in obj:
+                _update_hash(h, item, seen)
+        elif isinstance(obj, dict):
+            _update_unordered(h, b"d", list(obj.items()), seen)
+        elif isinstance(obj, (set, frozenset)):
+            _update_unordered(h, b"e", list(obj), seen)
+        else:
+            _update_bytes(h, b"D", _type_name(obj))
+            for field in dataclasses.fields(obj):
+                _update_bytes(h, b"k", field.name.encode())
+                _update_hash(h, getattr(obj, field.name), seen)
+        seen.discard(id(obj))
+    elif type(obj).__repr__ is object.__repr__ and hasattr(obj, "__dict__"):
+        # the default repr contains the memory address: hash the fields instead
+        seen.add(id(obj))
+        _update_bytes(h, b"o", _type_name(obj))
+        _update_unordered(h, b"d", list(vars(obj).items()), seen)
+        seen.discard(id(obj))
+    else:
+        _update_bytes(h, b"r", _type_name(obj) + b":" + repr(obj).encode())
+
+
+def _hash_structure(obj) -> str:
+    """Canonical hash of an object (see `_update_hash`)"""
+    h = xxhash.xxh64(seed=HASH_SEED)
+    _update_hash(h, obj, set())
+    return str(h.intdigest())
+
+
+def _hash_obj(obj, max_len: Optional[int] = MAX_ARG_HASH_LEN) -> str:
+    if isinstance(obj, (np.ndarray, pd.Series, pd.DataFrame)):
+        h = _hash_memo.get(obj) if HASH_MEMO else None
+        if h is None:
+            h = _hash_ndarray(obj) if isinstance(obj, np.ndarray) else _hash_pandas(obj)
+            if HASH_MEMO:
+                _hash_memo.put(obj, h)
+    elif isinstance(obj, _READABLE_TYPES) and not isinstance(obj, enum.Enum):
         h = str(obj)
+    elif _get_hasher(obj) is not None:
+        h = _get_hasher(obj)(obj)
+    else:
+        h = _hash_structure(obj)
     if (max_len is not None) and (len(h) > max_len):
-        xxhasher.update(h)
-        h_sffx = str(xxhasher.intdigest())
-        xxhasher.reset()
+        h_sffx = str(xxhash.xxh64_intdigest(h, seed=HASH_SEED))
         h = f"{h[: max_len - len(h_sffx) - 1]}-{h_sffx}"
     return h
 
@@ -94,6 +524,7 @@ def _get_cache_name(
     args: list,
     kwargs: dict,
     max_name_len: Optional[int] = MAX_NAME_LEN,
+    hash_arg: Callable[[Any], str] = _hash_obj_cached,
 ) -> str:
     if ignore_args is None:
         ignore_args = parameters is not None
@@ -105,25 +536,21 @@ def _get_cache_name(
     if parameters is not None:
         _n.extend(
             [
-                str(k) + kwargs_sep + _hash_obj_cached(v)
+                str(k) + kwargs_sep + hash_arg(v)
                 for k, v in parameters.items()
                 if not _kw_is_private(k)
             ]
         )
     if not ignore_args:
-        _n.extend([_hash_obj_cached(a) for a in args])
+        _n.extend([hash_arg(a) for a in args])
     if not ignore_kwargs:
         _n.extend(
-            [
-                str(k) + kwargs_sep + _hash_obj_cached(v)
-                for k, v in kwargs.items()
-                if not _kw_is_private(k)
-            ]
+            [str(k) + kwargs_sep + hash_arg(v) for k, v in kwargs.items() if not _kw_is_private(k)]
         )
     elif isinstance(ignore_kwargs, list) or isinstance(ignore_kwargs, set):
         _n.extend(
             [
-                str(k) + kwargs_sep + _hash_obj_cached(v)
+                str(k) + kwargs_sep + hash_arg(v)
                 for k, v in kwargs.items()
                 if k not in ignore_kwargs
             ]
@@ -131,32 +558,449 @@ def _get_cache_name(
     else:
         assert isinstance(ignore_kwargs, bool)
     full_name = name_prefix + "_".join(_n)
-    if (max_name_len is not None) and (len(full_name) > max_name_len):
-        xxhasher.update(full_name)
-        h_sffx = str(xxhasher.intdigest())
-        xxhasher.reset()
+    if max_name_len is not None:
+        full_name = _shorten_name(full_name, max_name_len)
+    return full_name
+
+
+def _function_id(name: Optional[str], name_prefix: str, foo: Callable) -> str:
+    """Identify the function of a cache (cache names start with it, followed by arguments)"""
+    return name_prefix + (name if name is not None else foo.__name__)
+
+
+def _shorten_name(full_name: str, max_name_len: int = MAX_NAME_LEN) -> str:
+    if len(full_name) > max_name_len:
+        h_sffx = str(xxhash.xxh64_intdigest(full_name, seed=HASH_SEED))
         full_name = f"{full_name[: max_name_len - len(h_sffx) - 1]}-{h_sffx}"
     return full_name
 
 
-def _cached_load(ftype, path):
-    if ftype == "parquet":
-        data = pd.read_parquet(path)
-    elif ftype == "pickle":
-        data = dill.load(open(path, "rb"))
+class _LineageUnresolved(Exception):
+    """The lineage of a call is not known before its dependencies are computed"""
+
+
+class _AlwaysComputed(_LineageUnresolved):
+    """The function is called even if its cache exists (e.g. `override=True`)"""
+
+
+def _hash_obj_lineage(obj, max_len: int = MAX_ARG_HASH_LEN) -> str:
+    if hasattr(obj, "__cached_lineage__"):
+        return obj.__cached_lineage__()
+    return _hash_obj_cached(obj, max_len)
+
+
+def _has_lineage(values: Iterable) -> bool:
+    return any(hasattr(v, "__cached_lineage__") for v in values)
+
+
+def _item_lineage(lineage: str, item: Optional[int]) -> str:
+    return lineage if item is None else "{}[{}]".format(lineage, item)
+
+
+def _lineage_digest(full_name: str) -> str:
+    return xxhash.xxh64_hexdigest(full_name.encode(), seed=HASH_SEED)
+
+
+def _get_lineage(**name_kwargs) -> str:
+    """Get the lineage key of a call
+
+    Same as the (full) cache name, except that cached arguments are identified by the lineage
+    of the calls producing them instead of the hash of their data:
+    the key is known before upstream tasks are computed.
+    """
+    return _lineage_digest(
+        _get_cache_name(**name_kwargs, max_name_len=None, hash_arg=_hash_obj_lineage)
+    )
+
+
+def _lineage_path(folder: Union[Path, str], lineage: str, shard_levels: int = 0) -> Path:
+    folder = Path(folder).absolute() / LINEAGE_DIR_NAME
+    return CacheMeta._get_entry_dir(folder, lineage, shard_levels) / lineage
+
+
+def _write_lineage(folder: Union[Path, str], lineage: str, shard_levels: int, name: str) -> None:
+    """Save an alias: lineage key -> cache name"""
+    path = _lineage_path(folder, lineage, shard_levels)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _atomic_open(path, "wt") as f:
+        f.write(name)
+
+
+def _read_lineage(folder: Union[Path, str], lineage: str, shard_levels: int = 0) -> Optional[str]:
+    try:
+        return _lineage_path(folder, lineage, shard_levels).read_text()
+    except FileNotFoundError:
+        return None
+
+
+class _HashingWriter:
+    """Binary file wrapper that hashes all bytes written through it"""
+
+    def __init__(self, f):
+        self._f = f
+        self._hasher = xxhash.xxh64(seed=HASH_SEED)
+
+    def write(self, data) -> int:
+        self._hasher.update(data)
+        return self._f.write(data)
+
+    def tell(self) -> int:
+        return self._f.tell()
+
+    def flush(self) -> None:
+        self._f.flush()
+
+    @property
+    def closed(self) -> bool:
+        return self._f.closed
+
+    def hash_value(self) -> str:
+        return str(self._hasher.intdigest())
+
+
+class _CompressingWriter:
+    """Binary file wrapper that compresses written bytes block by block
+
+    Each block is stored as: raw size (uint64), compressed size (uint64), compressed bytes.
+    Any `pyarrow.Codec` can be used (incl. codecs without a streaming format, e.g. snappy),
+    memory use is bounded by the block size.
+    """
+
+    def __init__(self, f, codec: pyarrow.Codec, block_size: Optional[int] = None):
+        self._f = f
+        self._codec = codec
+        self._block_size = block_size if block_size is not None else COMPRESSION_BLOCK_SIZE
+        self._buffer = bytearray()
+
+    def write(self, data) -> int:
+        data = memoryview(data).cast("B")
+        self._buffer += data
+        if len(self._buffer) >= self._block_size:
+            self._write_block()
+        return len(data)
+
+    def _write_block(self) -> None:
+        compressed = self._codec.compress(self._buffer, asbytes=True)
+        self._f.write(_BLOCK_HEADER.pack(len(self._buffer), len(compressed)))
+        self._f.write(compressed)
+        self._buffer = bytearray()
+
+    def close(self) -> None:
+        if self._buffer:
+            self._write_block()
+
+
+class _DecompressingReader(io.RawIOBase):
+    """Read a file written by `_CompressingWriter`"""
+
+    def __init__(self, f, codec: pyarrow.Codec):
+        self._f = f
+        self._codec = codec
+        self._block = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if not self._block:
+            header = self._f.read(_BLOCK_HEADER.size)
+            if not header:
+                return 0
+            raw_size, compressed_size = _BLOCK_HEADER.unpack(header)
+            compressed = self._f.read(compressed_size)
+            self._block = memoryview(
+                self._codec.decompress(compressed, decompressed_size=raw_size, asbytes=True)
+            )
+        n = min(len(b), len(self._block))
+        b[:n] = self._block[:n]
+        self._block = self._block[n:]
+        return n
+
+
+def _get_codec(compression: str, compression_level: Optional[int]) -> pyarrow.Codec:
+    try:
+        return pyarrow.Codec(compression, compression_level)
+    except (ValueError, NotImplementedError, pyarrow.ArrowException) as e:
+        raise ValueError(f"compression {compression} is not supported: {e}") from e
+
+
+def _check_compression(
+    ftype: str, compression: Optional[str], compression_level: Optional[int]
+) -> None:
+    """Raise ValueError if the codec (and level) cannot be used for the file type"""
+    if compression is None and ftype == "parquet":
+        compression = "snappy"  # parquet default
+    if compression is None:
+        if compression_level is not None:
+            raise ValueError(
+                "compression_level {} is not supported without compression".format(
+                    compression_level
+                )
+            )
+        return
+    if ftype == "arrow" and compression not in ("lz4", "zstd"):
+        raise ValueError("compression {} is not supported for ftype arrow".format(compression))
+    _get_codec(compression, compression_level)
+
+
+def _map_io(fn: Callable, items: list, max_workers: int) -> list:
+    """Apply an I/O-bound function to items concurrently (results in the order of items)
+
+    File I/O, pyarrow and compression release the GIL, so threads read / write in parallel.
+    """
+    if max_workers <= 1 or len(items) <= 1:
+        return [fn(x) for x in items]
+    with ThreadPoolExecutor(
+        max_workers=min(max_workers, len(items)), thread_name_prefix="dutil-io"
+    ) as executor:
+        return list(executor.map(fn, items))
+
+
+@contextmanager
+def _atomic_open(path: Path, mode: str = "wb"):
+    """Write to a temporary file and move it to `path` on success
+
+    Readers never see a partially written file.
+    """
+    tmp_path = path.with_name(f".{uuid.uuid4().hex}.tmp")  # same folder: atomic os.replace
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def _data_kind(data) -> Optional[str]:
+    """Type of tabular data saved natively to 'parquet' / 'arrow' (none for pandas)"""
+    if isinstance(data, pyarrow.Table):
+        return "arrow_table"
+    elif isinstance(data, pyarrow.RecordBatch):
+        return "arrow_batch"
+    elif type(data).__module__.startswith("polars.") and type(data).__name__ == "DataFrame":
+        return "polars"
+    else:
+        return None
+
+
+def _to_arrow_table(data) -> pyarrow.Table:
+    kind = _data_kind(data)
+    if kind == "arrow_table":
+        return data
+    elif kind == "arrow_batch":
+        return pyarrow.Table.from_batches([data])
+    elif kind == "polars":
+        return data.to_arrow()
+    else:
+        return pyarrow.Table.from_pandas(data, preserve_index=False)
+
+
+def _from_arrow_table(table: pyarrow.Table, kind: str):
+    """Convert a loaded table to the saved type without copying data where possible"""
+    if kind == "arrow_table":
+        return table
+    elif kind == "arrow_batch":
+        batches = table.combine_chunks().to_batches()
+        return batches[0] if batches else pyarrow.RecordBatch.from_pylist([], schema=table.schema)
+    elif kind == "polars":
+        import polars  # optional dependency
+
+        return polars.from_arrow(table, rechunk=False)
+    else:
+        raise ValueError("kind {} is not recognized".format(kind))
+
+
+def _cached_load(
+    ftype,
+    path,
+    compression: Optional[str] = None,
+    columns: Optional[list[str]] = None,
+    filters: Optional[list] = None,
+    kind: Optional[str] = None,
+):
+    """Load data from a cache file
+
+    :param kind: type of saved arrow / polars data (see `_data_kind`), none for pandas
+    """
+    if (columns is not None or filters is not None) and ftype not in ("parquet", "arrow"):
+        raise ValueError("columns / filters are not supported for ftype {}".format(ftype))
+    if ftype == "parquet" and kind is not None:
+        table = pyarrow.parquet.read_table(path, columns=columns, filters=filters)
+        data = _from_arrow_table(table, kind)
+    elif ftype == "parquet":
+        # only the selected columns and row groups (by column statistics) are read
+        data = pd.read_parquet(path, columns=columns, filters=filters)
+    elif ftype == "arrow":
+        # memory-mapped: pages are read lazily and shared between processes via the page cache
+        with pyarrow.memory_map(str(path), "r") as source:
+            table = pyarrow.ipc.open_file(source).read_all()
+        if filters is not None:
+            table = table.filter(pyarrow.parquet.filters_to_expression(filters))
+        if columns is not None:
+            table = table.select(columns)
+        if kind is not None:
+            data = _from_arrow_table(table, kind)  # zero-copy
+        else:
+            # split_blocks: numeric columns without nulls become zero-copy (read-only) views
+            data = table.to_pandas(split_blocks=True)
+    elif ftype == "npy" and compression is None:
+        data = np.load(path, mmap_mode="r", allow_pickle=False)
+    elif ftype in ("npy", "pickle"):
+        with open(path, "rb") as f:
+            if compression is not None:
+                f = io.BufferedReader(_DecompressingReader(f, _get_codec(compression, None)))
+            if ftype == "npy":
+                data = np.lib.format.read_array(f, allow_pickle=False)
+            else:
+                data = dill.load(f)
     else:
         raise ValueError("ftype {} is not recognized".format(ftype))
     return data
 
 
-def _cached_save(data, ftype, path) -> None:
+def _cached_save(
+    data,
+    ftype,
+    path,
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
+    row_group_size: Optional[int] = None,
+) -> str:
+    """Save data to a cache file and return the hash of the written bytes"""
     path.parent.mkdir(parents=True, exist_ok=True)
-    if ftype == "parquet":
-        data.to_parquet(path, index=False, allow_truncated_timestamps=True)
-    elif ftype == "pickle":
-        dill.dump(data, open(path, "wb"))
-    else:
-        raise ValueError("ftype {} is not recognized".format(ftype))
+    with _atomic_open(path, "wb") as f:
+        writer = _HashingWriter(f)
+        if ftype == "parquet" and _data_kind(data) is not None:
+            pyarrow.parquet.write_table(
+                _to_arrow_table(data),
+                writer,
+                compression=compression if compression is not None else "snappy",
+                compression_level=compression_level,
+                row_group_size=row_group_size,
+            )
+        elif ftype == "parquet":
+            data.to_parquet(
+                writer,
+                index=False,
+                allow_truncated_timestamps=True,
+                compression=compression if compression is not None else "snappy",
+                compression_level=compression_level,
+                row_group_size=row_group_size,
+            )
+        elif ftype == "arrow":
+            table = _to_arrow_table(data)
+            options = pyarrow.ipc.IpcWriteOptions(
+                compression=(
+                    _get_codec(compression, compression_level) if compression is not None else None
+                )
+            )
+            with pyarrow.ipc.new_file(writer, table.schema, options=options) as ipc_writer:
+                ipc_writer.write_table(table, max_chunksize=row_group_size)
+        elif ftype in ("npy", "pickle"):
+            stream = writer
+            if compression is not None:
+                stream = _CompressingWriter(writer, _get_codec(compression, compression_level))
+            if ftype == "npy":
+                np.save(stream, data, allow_pickle=False)
+            else:
+                dill.dump(data, stream)
+            if compression is not None:
+                stream.close()
+        else:
+            raise ValueError("ftype {} is not recognized".format(ftype))
+    return writer.hash_value()
+
+
+class _ModuleLogger:
+    """Default logger of `cached` functions, pickled by reference
+
+    A pickled function (process / distributed workers) logs with the logger of its process.
+    """
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(_logger, name)
+
+
+class MemoryCache:
+    """Process-local in-memory tier for cached results
+
+    Shared by all `cached` functions it is passed to and keyed by cache file.
+    Least recently used values are evicted once `max_bytes` is exceeded.
+    Loaded values are shared between calls: do not modify them in place.
+
+    :param max_bytes: memory budget (estimated with `dask.sizeof`)
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._entries: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # each process has its own (empty) tier, e.g. process / distributed workers
+        return (MemoryCache, (self.max_bytes,))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get a value and mark it as recently used"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            else:
+                self.misses += 1
+                return default
+
+    def put(self, key: str, value: Any) -> None:
+        """Add a value, evicting least recently used values if over budget"""
+        nbytes = sizeof(value)
+        with self._lock:
+            self._pop(key)
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def discard(self, key: str, prefix: bool = False) -> None:
+        """Remove a value (if prefix, all values whose keys start with `key`)"""
+        with self._lock:
+            for k in [k for k in self._entries if k.startswith(key)] if prefix else [key]:
+                self._pop(k)
+
+    def _pop(self, key: str) -> None:
+        if key in self._entries:
+            _, nbytes = self._entries.pop(key)
+            self.nbytes -= nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def info(self) -> dict:
+        """Get usage statistics"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "items": len(self),
+            "nbytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+        }
 
 
 class CacheMeta:
@@ -169,45 +1013,451 @@ class CacheMeta:
         ftype: str,
         nout: Optional[int],
         hash_value: Optional[str],
+        compression: Optional[str] = None,
+        compression_level: Optional[int] = None,
+        size: Optional[int] = None,
+        hits: int = 0,
+        row_group_size: Optional[int] = None,
+        sort_by: Optional[Union[str, list[str]]] = None,
+        range_column: Optional[str] = None,
+        partitions: Optional[list] = None,
+        nparts: Optional[int] = None,
+        kind: Optional[Union[str, list[Optional[str]]]] = None,
+        lineage: Optional[str] = None,
+        compute_time: Optional[float] = None,
+        peak_memory: Optional[int] = None,
+        function: Optional[str] = None,
+        catalog: Optional[CacheCatalog] = None,
+        shard_levels: int = 0,
     ):
         self.name = name
         self._folder = Path(folder).absolute()
         self.ftype = ftype
         self.nout = nout
         self.hash_value = hash_value
+        self.compression = compression
+        self.compression_level = compression_level
+        self.size = size  # total size of cache files in bytes
+        self.hits = hits  # number of cache hits (tracked in folders with a size limit)
+        self.row_group_size = row_group_size
+        self.sort_by = sort_by
+        self.range_column = range_column  # incremental caches only
+        self.partitions = partitions  # [start, end, hash] of each partition (incremental caches)
+        self.nparts = nparts  # number of chunks (generator functions)
+        self.kind = kind  # type of arrow / polars data (per output with `nout`), none for pandas
+        self.lineage = lineage  # lineage key of the last call saving / finding this cache
+        self.compute_time = compute_time  # seconds spent in the function (excl. saving)
+        self.peak_memory = peak_memory  # peak increase of resident memory during the call
+        self.function = function  # name prefix + function name (see `_function_id`)
+        self._catalog = catalog  # if none, meta data is stored in a json file
+        self._shard_levels = shard_levels
+        self._dir = self._get_entry_dir(self._folder, name, shard_levels)
 
     @staticmethod
-    def _get_meta_path(folder: Union[Path, str], name: str) -> Path:
-        return Path(folder).absolute() / (name + ".meta")
+    def _get_entry_dir(folder: Union[Path, str], name: str, shard_levels: int = 0) -> Path:
+        """Get the folder of cache files: `folder/ab/cd/` for two shard levels"""
+        folder = Path(folder).absolute()
+        if shard_levels:
+            h = xxhash.xxh64_hexdigest(name.encode(), seed=HASH_SEED)
+            folder = folder.joinpath(
+                *(h[i * SHARD_WIDTH : (i + 1) * SHARD_WIDTH] for i in range(shard_levels))
+            )
+        return folder
+
+    @classmethod
+    def _get_meta_path(cls, folder: Union[Path, str], name: str, shard_levels: int = 0) -> Path:
+        return cls._get_entry_dir(folder, name, shard_levels) / (name + ".meta")
+
+    @property
+    def folder(self) -> Path:
+        return self._folder
+
+    @property
+    def shard_levels(self) -> int:
+        return self._shard_levels
 
     @property
     def meta_path(self) -> Path:
-        return self._get_meta_path(folder=self._folder, name=self.name)
+        return self._dir / (self.name + ".meta")
+
+    @property
+    def lock_path(self) -> Path:
+        return self._dir / (self.name + ".lock")
 
     @property
     def cache_path(self) -> Union[Path, list[Path]]:
         if self.nout is None:
-            return self._folder / (self.name + f".{self.ftype}")
+            return self._dir / (self.name + f".{self.ftype}")
         else:
-            return [self._folder / (self.name + f"__{i}.{self.ftype}") for i in range(self.nout)]
+            return [self._dir / (self.name + f"__{i}.{self.ftype}") for i in range(self.nout)]
+
+    @property
+    def cache_paths(self) -> list[Path]:
+        if self.partitions is not None:
+            # empty sub-ranges are recorded without a file (hash is none)
+            return [
+                self.partition_path(i) for i, p in enumerate(self.partitions) if p[2] is not None
+            ]
+        if self.nparts is not None:
+            return [self.part_path(i) for i in range(self.nparts)]
+        return [self.cache_path] if self.nout is None else self.cache_path
+
+    def partition_path(self, i: int) -> Path:
+        return self._dir / (self.name + f"__r{i}.{self.ftype}")
+
+    def part_path(self, i: int) -> Path:
+        return self._dir / (self.name + f"__p{i}.{self.ftype}")
+
+    def item_kind(self, item: Optional[int]) -> Optional[str]:
+        if item is None or self.kind is None:
+            return self.kind
+        return self.kind[item]
+
+    @property
+    def fields(self) -> dict:
+        return {k: v for k, v in self.__dict__.items() if not k.startswith("_")}
 
     @classmethod
-    def from_file(cls, folder: Union[Path, str], name: str) -> CacheMeta:
-        meta_path = cls._get_meta_path(folder=folder, name=name)
-        if meta_path.exists():
+    def from_file(
+        cls,
+        folder: Union[Path, str],
+        name: str,
+        catalog: Optional[CacheCatalog] = None,
+        shard_levels: int = 0,
+    ) -> CacheMeta:
+        """Read meta data from the catalog (if given) or from the meta file
+
+        Entries found only in a meta file are added to the catalog.
+        """
+        if catalog is not None:
+            fields = catalog.get(name)
+            if fields is not None:
+                return cls(folder=folder, catalog=catalog, shard_levels=shard_levels, **fields)
+        meta_path = cls._get_meta_path(folder=folder, name=name, shard_levels=shard_levels)
+        try:
             with open(meta_path, "rt") as f:
                 fields = json.load(f)
-            # for k, v in fields.items():
-            #     if isinstance(v, list):
-            #         fields[k] = tuple(v)
-            return cls(folder=folder, **fields)
-        else:
-            raise FileNotFoundError(f"Meta file is missing: {meta_path}")
+            accessed = meta_path.stat().st_mtime
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Meta file is missing: {meta_path}") from None
+        # for k, v in fields.items():
+        #     if isinstance(v, list):
+        #         fields[k] = tuple(v)
+        meta = cls(folder=folder, catalog=catalog, shard_levels=shard_levels, **fields)
+        if catalog is not None:
+            catalog.put(meta.fields, accessed=accessed)
+        return meta
 
     def dump_to_file(self) -> None:
-        with open(self.meta_path, "wt") as f:
-            fields = {k: v for k, v in self.__dict__.items() if not k.startswith("_")}
-            json.dump(fields, f)
+        """Save meta data to the catalog (if given) or to the meta file"""
+        if self._catalog is not None:
+            self._catalog.put(self.fields)
+        else:
+            with _atomic_open(self.meta_path, "wt") as f:
+                json.dump(self.fields, f)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        # connections are opened per process
+        state["_catalog"] = self._catalog.path if self._catalog is not None else None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        path = state["_catalog"]
+        self._catalog = _get_catalog(self._folder, path) if path is not None else None
+
+    def exists(self) -> bool:
+        if self._catalog is not None and self.name in self._catalog:
+            return True
+        return self.meta_path.exists()
+
+    def remove_files(self) -> None:
+        """Remove meta data (first) and all cache files"""
+        if self._catalog is not None:
+            self._catalog.remove(self.name)
+        for path in [self.meta_path] + self.cache_paths:
+            path.unlink(missing_ok=True)
+
+
+class _FolderQuota:
+    """Size limit of a cache folder with incremental LRU / LFU eviction of whole entries
+
+    Entry sizes and access stats are read from meta files (or the catalog) once per process
+    (and again every QUOTA_RESCAN_SECONDS to account for other processes),
+    then updated incrementally on every cache write and hit.
+    Without a catalog, last access time is the meta file mtime
+    and the number of hits is stored in the meta file.
+    Entries of results alive in this process (handed out by a hit or a write) are not evicted,
+    so the folder may exceed the limit until they are released.
+    """
+
+    def __init__(
+        self,
+        folder: Path,
+        max_bytes: int,
+        eviction: str,
+        catalog: Optional[CacheCatalog] = None,
+        shard_levels: int = 0,
+    ):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self.catalog = catalog
+        self.shard_levels = shard_levels
+        self.nbytes = 0
+        self._entries: dict[str, tuple[int, float, int]] = {}  # name -> size, accessed, hits
+        self._heap: list[tuple[tuple, str]] = []  # eviction priority -> name (lazy deletion)
+        self._pins: dict[str, weakref.WeakSet] = {}  # name -> results using the entry
+        self._scanned_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _priority(self, accessed: float, hits: int) -> tuple:
+        return (accessed,) if self.eviction == "lru" else (hits, accessed)
+
+    def _set(self, name: str, size: int, accessed: float, hits: int) -> None:
+        self._discard(name)
+        self._entries[name] = (size, accessed, hits)
+        self.nbytes += size
+        heapq.heappush(self._heap, (self._priority(accessed, hits), name))
+
+    def _discard(self, name: str) -> None:
+        if name in self._entries:
+            self.nbytes -= self._entries.pop(name)[0]
+
+    def _scan(self) -> None:
+        self._entries.clear()
+        self._heap.clear()
+        self.nbytes = 0
+        if self.catalog is not None:  # meta files are not scanned (see `CacheCatalog.migrate`)
+            for name, size, accessed, hits in self.catalog.entries():
+                self._set(name, size, accessed, hits)
+            self._scanned_at = time.monotonic()
+            return
+        for meta_path in self.folder.glob("*/" * self.shard_levels + "*.meta"):
+            try:
+                meta = CacheMeta.from_file(
+                    folder=self.folder, name=meta_path.stem, shard_levels=self.shard_levels
+                )
+                accessed = meta_path.stat().st_mtime
+                size = meta.size
+                if size is None:  # written by an older version
+                    size = sum(p.stat().st_size for p in meta.cache_paths if p.exists())
+            except (FileNotFoundError, ValueError, TypeError):  # removed or not readable
+                continue
+            self._set(meta.name, size, accessed, meta.hits)
+        self._scanned_at = time.monotonic()
+
+    def _maybe_scan(self) -> None:
+        if self._scanned_at is None or time.monotonic() - self._scanned_at > QUOTA_RESCAN_SECONDS:
+            self._scan()
+
+    def _pin(self, name: str, owner: Optional[Any]) -> None:
+        if owner is not None:
+            self._pins.setdefault(name, weakref.WeakSet()).add(owner)
+
+    def _is_pinned(self, name: str) -> bool:
+        owners = self._pins.get(name)
+        if owners is not None and not owners:
+            del self._pins[name]  # all results have been released
+            owners = None
+        return owners is not None
+
+    def _pop_victims(self, keep: str) -> list[str]:
+        victims = []
+        kept = []
+        while self.nbytes > self.max_bytes and self._heap:
+            priority, name = heapq.heappop(self._heap)
+            entry = self._entries.get(name)
+            if entry is None or self._priority(entry[1], entry[2]) != priority:
+                continue  # outdated heap item
+            if name == keep or self._is_pinned(name):
+                kept.append((priority, name))
+                continue
+            self._discard(name)
+            victims.append(name)
+        for item in kept:
+            heapq.heappush(self._heap, item)
+        return victims
+
+    def touch(self, meta: CacheMeta, owner: Optional[Any] = None) -> None:
+        """Register a cache hit
+
+        :param owner: the entry is not evicted while this object (a result) is alive
+        """
+        with self._lock:
+            self._maybe_scan()
+            self._pin(meta.name, owner)
+            size, _, hits = self._entries.get(meta.name, (meta.size or 0, 0.0, meta.hits))
+            self._set(meta.name, size, time.time(), hits + 1)
+        meta.hits = hits + 1
+        if self.catalog is not None:
+            self.catalog.touch(meta.name, meta.hits)
+            return
+        try:
+            if self.eviction == "lfu":
+                meta.dump_to_file()
+            else:
+                os.utime(meta.meta_path)
+        except FileNotFoundError:  # removed by another process
+            pass
+
+    def add(self, meta: CacheMeta, owner: Optional[Any] = None) -> None:
+        """Register a cache write and evict other entries if the folder is too big
+
+        :param owner: the entry is not evicted while this object (a result) is alive
+        """
+        with self._lock:
+            self._maybe_scan()
+            self._pin(meta.name, owner)
+            self._set(meta.name, meta.size or 0, time.time(), meta.hits)
+            victims = self._pop_victims(keep=meta.name)
+        for name in victims:
+            try:
+                CacheMeta.from_file(
+                    folder=self.folder,
+                    name=name,
+                    catalog=self.catalog,
+                    shard_levels=self.shard_levels,
+                ).remove_files()
+            except FileNotFoundError:  # removed by another process
+                pass
+
+
+_folder_quotas: dict[Path, _FolderQuota] = {}
+_folder_quotas_lock = threading.Lock()
+
+
+def _get_folder_quota(
+    folder: Union[Path, str],
+    max_bytes: int,
+    eviction: str,
+    catalog: Optional[CacheCatalog] = None,
+    shard_levels: int = 0,
+) -> _FolderQuota:
+    folder = Path(folder).absolute()
+    with _folder_quotas_lock:
+        quota = _folder_quotas.get(folder)
+        if (
+            quota is None
+            or quota.eviction != eviction
+            or quota.catalog is not catalog
+            or quota.shard_levels != shard_levels
+        ):
+            quota = _folder_quotas[folder] = _FolderQuota(
+                folder, max_bytes, eviction, catalog, shard_levels
+            )
+        quota.max_bytes = max_bytes
+        return quota
+
+
+_writer_executor: Optional[ThreadPoolExecutor] = None
+_writer_executor_lock = threading.Lock()
+_pending_writes: dict[str, CachedResult] = {}  # meta path -> result being written
+_write_futures: list[Future] = []  # background writes not awaited yet
+_pending_writes_lock = threading.Lock()
+
+
+def _get_writer_executor() -> ThreadPoolExecutor:
+    global _writer_executor
+    with _writer_executor_lock:
+        if _writer_executor is None:
+            _writer_executor = ThreadPoolExecutor(
+                max_workers=WRITE_BEHIND_MAX_WORKERS, thread_name_prefix="dutil-write"
+            )
+        return _writer_executor
+
+
+_prefetch_executor: Optional[ThreadPoolExecutor] = None
+_prefetch_executor_lock = threading.Lock()
+
+
+def _get_prefetch_executor() -> ThreadPoolExecutor:
+    global _prefetch_executor
+    with _prefetch_executor_lock:
+        if _prefetch_executor is None:
+            _prefetch_executor = ThreadPoolExecutor(
+                max_workers=PREFETCH_MAX_WORKERS, thread_name_prefix="dutil-prefetch"
+            )
+        return _prefetch_executor
+
+
+def wait_for_writes(timeout: Optional[float] = None) -> None:
+    """Wait until all background cache writes (`cached(write_behind=True)`) are finished
+
+    :param timeout: max seconds to wait
+    :raises: the first error of failed writes, TimeoutError if not finished in time
+    """
+    with _pending_writes_lock:
+        futures = list(_write_futures)
+        _write_futures.clear()
+    _, not_done = _wait_futures(futures, timeout=timeout)
+    if not_done:
+        with _pending_writes_lock:
+            _write_futures.extend(not_done)
+        raise TimeoutError(f"{len(not_done)} cache writes are not finished")
+    for future in futures:
+        future.result()
+
+
+def _range_bound(value) -> Union[int, float, pd.Timestamp]:
+    """Normalize a range argument: numbers are kept, anything else is converted to a timestamp"""
+    if isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool):
+        return value.item() if isinstance(value, np.generic) else value
+    return pd.Timestamp(value)
+
+
+def _encode_bound(bound) -> Union[int, float, str]:
+    return bound.isoformat() if isinstance(bound, pd.Timestamp) else bound
+
+
+def _decode_bound(value) -> Union[int, float, pd.Timestamp]:
+    return pd.Timestamp(value) if isinstance(value, str) else value
+
+
+def _range_value(bound, like):
+    """Convert a range bound to the type of the user argument `like`"""
+    if isinstance(bound, pd.Timestamp):
+        if isinstance(like, dt.datetime):
+            return bound if isinstance(like, pd.Timestamp) else bound.to_pydatetime()
+        if isinstance(like, dt.date):
+            return bound.date()
+        if isinstance(like, np.datetime64):
+            return bound.to_datetime64()
+        if isinstance(like, str):
+            return bound.isoformat() if bound != bound.normalize() else str(bound.date())
+        return bound
+    return type(like)(bound)
+
+
+def _range_gaps(covered: list[tuple], start, end) -> list[tuple]:
+    """Get sub-ranges of [start, end] not covered by closed intervals
+
+    :return: list of (lo, lo_open, hi, hi_open)
+    """
+    gaps = []
+    cur, cur_open = start, False
+    for lo, hi in sorted(covered):
+        if lo > end:
+            break
+        if hi < cur:
+            continue
+        if lo > cur:
+            gaps.append((cur, cur_open, lo, True))
+        if hi >= cur:
+            cur, cur_open = hi, True
+    if cur < end or (cur == end and not cur_open):
+        gaps.append((cur, cur_open, end, False))
+    return gaps
+
+
+def _and_filters(filters: Optional[list], conditions: list[tuple]) -> list:
+    """Add conditions to row filters in the `pyarrow.parquet` format (incl. disjunctive form)"""
+    if not filters:
+        return conditions
+    if isinstance(filters[0], list):
+        return [list(f) + conditions for f in filters]
+    return list(filters) + conditions
 
 
 class CachedResult:
@@ -229,8 +1479,19 @@ class CachedResult:
         kwargs,
         logger,
         nout,
+        memory_cache=None,
+        compression=None,
+        compression_level=None,
+        quota=None,
+        io_workers=IO_MAX_WORKERS,
+        catalog=None,
+        shard_levels=0,
+        row_group_size=None,
+        sort_by=None,
+        range_column=None,
+        value_range=None,
     ):
-        cache_name = _get_cache_name(
+        name_kwargs = dict(
             name=name,
             name_prefix=name_prefix,
             parameters=parameters,
@@ -241,50 +1502,494 @@ class CachedResult:
             args=args,
             kwargs=kwargs,
         )
+        full_name = _get_cache_name(**name_kwargs, max_name_len=None)
+        cache_name = _shorten_name(full_name)
+        # without cached arguments, the lineage key is the cache name (no alias is saved)
+        has_lineage = _has_lineage(list(args) + list(kwargs.values()))
+        if value_range is not None:
+            lineage = None  # incremental caches are not pruned from task graphs
+        elif has_lineage:
+            lineage = _get_lineage(**name_kwargs)
+        else:
+            lineage = _lineage_digest(full_name)
+        with _pending_writes_lock:
+            pending = _pending_writes.get(
+                str(CacheMeta._get_meta_path(folder, cache_name, shard_levels))
+            )
+        if pending is not None and value_range is None:
+            return pending  # data is in memory and being written in the background
         try:
-            meta = CacheMeta.from_file(folder=folder, name=cache_name)
+            meta = CacheMeta.from_file(
+                folder=folder, name=cache_name, catalog=catalog, shard_levels=shard_levels
+            )
         except FileNotFoundError as e:
             logger.debug(str(e))
             meta = CacheMeta(
-                name=cache_name, folder=folder, ftype=ftype, nout=nout, hash_value=None
+                name=cache_name,
+                folder=folder,
+                ftype=ftype,
+                nout=nout,
+                hash_value=None,
+                compression=compression,
+                compression_level=compression_level,
+                row_group_size=row_group_size,
+                sort_by=sort_by,
+                range_column=range_column,
+                partitions=[] if range_column is not None else None,
+                catalog=catalog,
+                shard_levels=shard_levels,
             )
-        return cls(meta=meta, logger=logger)
+        meta.function = _function_id(name, name_prefix, foo)
+        result = cls(
+            meta=meta,
+            logger=logger,
+            memory_cache=memory_cache,
+            quota=quota,
+            io_workers=io_workers,
+        )
+        result.value_range = value_range
+        result.lineage = lineage
+        result.lineage_alias = has_lineage
+        return result
 
-    def __init__(self, meta: CacheMeta, logger):
+    def __init__(
+        self,
+        meta: CacheMeta,
+        logger,
+        memory_cache: Optional[MemoryCache] = None,
+        quota: Optional[_FolderQuota] = None,
+        io_workers: int = IO_MAX_WORKERS,
+    ):
         self.meta = meta
         self.logger = logger
+        self.memory_cache = memory_cache
+        self.quota = quota
+        self.io_workers = io_workers
         self._cache_value = None
-        self._lock_dump_load = multiprocessing.Lock()
-        self._lock_hash = multiprocessing.Lock()
+        self._item_values: dict[int, Any] = {}  # loaded outputs of functions with `nout`
+        self._lock_dump_load = threading.Lock()
+        self._lock_hash = threading.Lock()
+        self._pending_write: Optional[Future] = None
+        self.value_range: Optional[tuple] = None  # requested (start, end) of incremental caches
+        self.lineage: Optional[str] = None  # see `_get_lineage`
+        self.lineage_alias = False  # if true, save an alias lineage key -> cache name
+
+    def __getstate__(self) -> dict:
+        """Pickle meta data only, e.g. results sent by process / distributed workers
+
+        Data is loaded from cache again after unpickling; a pending write is finished first.
+        """
+        if self._pending_write is not None:
+            self._pending_write.result()
+        state = self.__dict__.copy()
+        state.update(
+            memory_cache=None,
+            quota=None,
+            _cache_value=None,
+            _item_values={},
+            _lock_dump_load=None,
+            _lock_hash=None,
+            _pending_write=None,
+        )
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock_dump_load = threading.Lock()
+        self._lock_hash = threading.Lock()
 
     def load(self) -> Any:
-        """Load data from cache"""
+        """Load data from cache
 
+        Output of generator functions is an iterator reading one chunk at a time.
+        """
+
+        if self.meta.nparts is not None:
+            return self._iter_parts()
+        if self.meta.nout is not None:
+            return tuple(self.load_items(range(self.meta.nout)))
+        if self._cache_value is None and self.memory_cache is not None:
+            self._cache_value = self.memory_cache.get(self._memory_key)
+            if self._cache_value is not None:
+                self.logger.debug(
+                    "Task {}: data has been loaded from memory cache".format(self.meta.name)
+                )
         if self._cache_value is None:
             with self._lock_dump_load:
-                if self.meta.nout is None:
-                    self._cache_value = _cached_load(self.meta.ftype, self.meta.cache_path)
+                if self._cache_value is not None:
+                    return self._cache_value  # loaded by another thread (e.g. read-ahead)
+                if self.meta.partitions is not None:
+                    self._cache_value = self._load_range()
                 else:
-                    self._cache_value = tuple(
-                        _cached_load(self.meta.ftype, cp) for cp in self.meta.cache_path
+                    self._cache_value = _cached_load(
+                        self.meta.ftype,
+                        self.meta.cache_path,
+                        self.meta.compression,
+                        kind=self.meta.kind,
                     )
+            if self.memory_cache is not None:
+                self.memory_cache.put(self._memory_key, self._cache_value)
             self.logger.debug("Task {}: data has been loaded from cache".format(self.meta.name))
         return self._cache_value
 
+    def prefetch(self) -> Optional[Future]:
+        """Start loading data on a background thread (`load` then waits for it)
+
+        Output of generator functions is not prefetched.
+        """
+        if self.meta.nparts is not None:
+            return None
+        return _get_prefetch_executor().submit(self._prefetch)
+
+    def _prefetch(self) -> None:
+        try:
+            self.load()
+        except Exception as e:  # the error is raised again by `load` in the consumer
+            self.logger.debug("Task {}: read-ahead has failed: {}".format(self.meta.name, e))
+
+    def load_item(self, item: int) -> Any:
+        """Load one output of a function with multiple outputs (reads only its file)"""
+        return self.load_items([item])[0]
+
+    def load_items(self, items: Iterable[int]) -> list:
+        """Load outputs of a function with multiple outputs
+
+        Each output is loaded and kept in memory independently: only files of outputs
+        that are not in memory yet are read (concurrently).
+        """
+        items = list(items)
+        if self.memory_cache is not None:
+            for i in items:
+                if i not in self._item_values:
+                    value = self.memory_cache.get(self._item_key(i))
+                    if value is not None:
+                        self._item_values[i] = value
+        if any(i not in self._item_values for i in items):
+            with self._lock_dump_load:
+                missing = [i for i in dict.fromkeys(items) if i not in self._item_values]
+                values = _map_io(
+                    lambda i: _cached_load(
+                        self.meta.ftype,
+                        self.meta.cache_path[i],
+                        self.meta.compression,
+                        kind=self.meta.item_kind(i),
+                    ),
+                    missing,
+                    self.io_workers,
+                )
+                for i, value in zip(missing, values):
+                    self._item_values[i] = value
+                    if self.memory_cache is not None:
+                        self.memory_cache.put(self._item_key(i), value)
+            self.logger.debug(
+                "Task {}: outputs {} have been loaded from cache".format(self.meta.name, missing)
+            )
+        return [self._item_values[i] for i in items]
+
+    def load_subset(
+        self,
+        columns: Optional[list[str]] = None,
+        filters: Optional[list] = None,
+        item: Optional[int] = None,
+    ) -> Any:
+        """Load selected columns / rows of a parquet or arrow cache file
+
+        Only the selection is read from disk, in-memory data is neither used nor updated.
+
+        :param columns: columns to load, if none load all
+        :param filters: row filters in the `pyarrow.parquet` format, e.g. `[("x", ">", 0)]`
+        :param item: output index (functions with multiple outputs)
+        """
+        if self.meta.partitions is not None:
+            return self._load_range(columns=columns, filters=filters)
+        if self.meta.nparts is not None:
+            return self._iter_parts(columns=columns, filters=filters)
+        if self.is_writing():
+            self._pending_write.result()
+        path = self.meta.cache_path if item is None else self.meta.cache_path[item]
+        data = _cached_load(
+            self.meta.ftype,
+            path,
+            self.meta.compression,
+            columns=columns,
+            filters=filters,
+            kind=self.meta.item_kind(item),
+        )
+        self.logger.debug("Task {}: data subset has been loaded from cache".format(self.meta.name))
+        return data
+
+    def _iter_parts(
+        self, columns: Optional[list[str]] = None, filters: Optional[list] = None
+    ) -> Iterator:
+        for i in range(self.meta.nparts):
+            yield _cached_load(
+                self.meta.ftype,
+                self.meta.part_path(i),
+                self.meta.compression,
+                columns=columns,
+                filters=filters,
+                kind=self.meta.kind,
+            )
+
+    def dump_stream(self, chunks: Iterable) -> None:
+        """Dump chunks to cache files one by one as they are produced
+
+        Chunks are not kept in memory. Meta data is saved once all chunks are written.
+        All chunks are expected to be of the same type.
+        """
+        n_old = self.meta.nparts or 0
+        self.meta.hash_value = None
+        hashes = []
+        with self._lock_dump_load:
+            for i, chunk in enumerate(chunks):
+                if i == 0:
+                    self.meta.kind = _data_kind(chunk)
+                hashes.append(
+                    _cached_save(
+                        self._sort(chunk),
+                        self.meta.ftype,
+                        self.meta.part_path(i),
+                        self.meta.compression,
+                        self.meta.compression_level,
+                        self.meta.row_group_size,
+                    )
+                )
+            for i in range(len(hashes), n_old):  # overridden cache had more chunks
+                self.meta.part_path(i).unlink(missing_ok=True)
+            self.meta.nparts = len(hashes)
+            self._cache_value = None
+        self.logger.debug(
+            "Task {}: {} chunks have been saved to cache".format(self.meta.name, len(hashes))
+        )
+        self.meta.size = sum(p.stat().st_size for p in self.meta.cache_paths)
+        self.meta.hits = 0
+        self.meta.hash_value = str(xxhash.xxh64_intdigest(json.dumps(hashes), seed=HASH_SEED))
+        self._link_lineage()
+        self.meta.dump_to_file()
+        if self.quota is not None:
+            self.quota.add(self.meta, owner=self)
+
+    def _overlapping_partitions(self) -> list[tuple[int, list]]:
+        """Get (index, [start, end, hash]) of partitions overlapping the requested range"""
+        start, end = self.value_range
+        partitions = [
+            (i, p)
+            for i, p in enumerate(self.meta.partitions)
+            if _decode_bound(p[0]) <= end and _decode_bound(p[1]) >= start
+        ]
+        return sorted(partitions, key=lambda ip: _decode_bound(ip[1][0]))
+
+    def _load_range(
+        self, columns: Optional[list[str]] = None, filters: Optional[list] = None
+    ) -> pd.DataFrame:
+        """Load the requested range of an incremental cache (concatenated partitions)"""
+        start, end = self.value_range
+        filters = _and_filters(
+            filters, [(self.meta.range_column, ">=", start), (self.meta.range_column, "<=", end)]
+        )
+        stored = [i for i, p in enumerate(self.meta.partitions) if p[2] is not None]
+        overlapping = [i for i, p in self._overlapping_partitions() if p[2] is not None]
+        if not stored:
+            return pd.DataFrame(columns=columns)  # no rows have ever been saved
+        # only empty sub-ranges are requested: filter any partition to get the schema
+        frames = _map_io(
+            lambda i: _cached_load(
+                self.meta.ftype,
+                self.meta.partition_path(i),
+                self.meta.compression,
+                columns=columns,
+                filters=filters,
+            ),
+            overlapping if overlapping else stored[:1],
+            self.io_workers,
+        )
+        return pd.concat(frames, ignore_index=True)
+
+    def missing_ranges(self) -> list[tuple]:
+        """Get sub-ranges of the requested range missing in an incremental cache
+
+        :return: list of (start, start_open, end, end_open)
+        """
+        covered = [(_decode_bound(p[0]), _decode_bound(p[1])) for p in self.meta.partitions]
+        return _range_gaps(covered, *self.value_range)
+
+    def append(self, data: pd.DataFrame, gap: tuple) -> None:
+        """Save data of a missing sub-range as a new partition of an incremental cache
+
+        Rows outside the sub-range (e.g. at the boundaries of existing partitions) are dropped.
+
+        :param gap: (start, start_open, end, end_open) as returned by `missing_ranges`
+        """
+        lo, lo_open, hi, hi_open = gap
+        if len(data) > 0:
+            if self.meta.range_column not in data.columns:
+                raise ValueError(
+                    "range_column {} is missing in the output".format(self.meta.range_column)
+                )
+            col = data[self.meta.range_column]
+            mask = (col > lo if lo_open else col >= lo) & (col < hi if hi_open else col <= hi)
+            data = self._sort(data.loc[mask])
+            if self.meta.sort_by is None:
+                data = data.reset_index(drop=True)
+        with self._lock_dump_load:
+            i = len(self.meta.partitions)
+            if len(data) == 0:
+                # only the coverage is recorded: an empty frame may lack columns / dtypes
+                hash_value = None
+            else:
+                hash_value = _cached_save(
+                    data,
+                    self.meta.ftype,
+                    self.meta.partition_path(i),
+                    self.meta.compression,
+                    self.meta.compression_level,
+                    self.meta.row_group_size,
+                )
+            self.meta.partitions.append([_encode_bound(lo), _encode_bound(hi), hash_value])
+            self.meta.size = sum(p.stat().st_size for p in self.meta.cache_paths)
+            self.meta.dump_to_file()
+            self.drop_loaded()
+        self.logger.debug(
+            "Task {}: partition [{}, {}] has been saved to cache".format(self.meta.name, lo, hi)
+        )
+        if self.quota is not None:
+            self.quota.add(self.meta, owner=self)
+
+    def drop_loaded(self) -> None:
+        """Forget loaded data of all ranges of an incremental cache (partitions have changed)"""
+        self._cache_value = None
+        if self.memory_cache is not None:
+            self.memory_cache.discard(str(self.meta.meta_path), prefix=True)
+
+    def _sort(self, data):
+        """Sort data frames by `sort_by` columns (rows are saved in this order)"""
+        if self.meta.sort_by is None:
+            return data
+
+        by = [self.meta.sort_by] if isinstance(self.meta.sort_by, str) else self.meta.sort_by
+
+        def sort(df):
+            if isinstance(df, pd.DataFrame):
+                return df.sort_values(by, kind="stable", ignore_index=True)
+            kind = _data_kind(df)
+            if kind in ("arrow_table", "arrow_batch"):
+                return df.sort_by([(c, "ascending") for c in by])
+            elif kind == "polars":
+                return df.sort(by, maintain_order=True)
+            return df
+
+        return sort(data) if self.meta.nout is None else tuple(sort(d) for d in data)
+
     def dump(self, data):
         """Update and dump data to cache"""
 
-        with self._lock_dump_load:
+        self.meta.hash_value = None  # may be outdated if the cache is overridden
+        self._dump(self._sort(data))
+
+    def dump_async(self, data, lock: Optional[FileLock] = None) -> Future:
+        """Update data and dump it to cache on a background thread
+
+        Data is kept in memory (and returned by `load`) until the write is finished.
+
+        :param lock: lock to release when the write is finished
+        """
+
+        self.meta.hash_value = None  # may be outdated if the cache is overridden
+        data = self._sort(data)
+        self._set_value(data)
+        with _pending_writes_lock:
+            _pending_writes[self._memory_key] = self
+            self._pending_write = _get_writer_executor().submit(
+                self._dump_in_background, data, lock
+            )
+            _write_futures.append(self._pending_write)
+        return self._pending_write
+
+    def _dump_in_background(self, data, lock: Optional[FileLock]) -> None:
+        try:
+            self._dump(data)
+        except Exception:
+            self.logger.exception("Task {}: failed to save cache".format(self.meta.name))
+            raise
+        finally:
+            with _pending_writes_lock:
+                if _pending_writes.get(self._memory_key) is self:
+                    del _pending_writes[self._memory_key]
+            if lock is not None:
+                lock.release()
+
+    def _set_value(self, data) -> None:
+        """Keep data in memory (and in the memory cache)"""
+        if self.meta.nout is None:
             self._cache_value = data
+            if self.memory_cache is not None:
+                self.memory_cache.put(self._memory_key, data)
+        else:
+            self._item_values = dict(enumerate(data))
+            if self.memory_cache is not None:
+                for i, value in self._item_values.items():
+                    self.memory_cache.put(self._item_key(i), value)
+
+    def _dump(self, data) -> None:
+        with self._lock_dump_load:
+            if self.meta.nout is not None:
+                assert len(data) == self.meta.nout
+                self.meta.kind = [_data_kind(d) for d in data]
+                if not any(self.meta.kind):
+                    self.meta.kind = None
+            else:
+                self.meta.kind = _data_kind(data)
+            self._set_value(data)
+            # the hash of the written bytes is stored in the meta file,
+            # so that downstream cache names never require loading this data
             if self.meta.nout is None:
-                _cached_save(self._cache_value, self.meta.ftype, self.meta.cache_path)
+                hash_value = _cached_save(
+                    data,
+                    self.meta.ftype,
+                    self.meta.cache_path,
+                    self.meta.compression,
+                    self.meta.compression_level,
+                    self.meta.row_group_size,
+                )
             else:
-                assert len(self._cache_value) == self.meta.nout
                 assert len(self.meta.cache_path) == self.meta.nout
-                for cv, cp in zip(self._cache_value, self.meta.cache_path):
-                    _cached_save(cv, self.meta.ftype, cp)
+                # each file is written atomically, meta data only after all of them
+                hash_value = _map_io(
+                    lambda cv_cp: _cached_save(
+                        cv_cp[0],
+                        self.meta.ftype,
+                        cv_cp[1],
+                        self.meta.compression,
+                        self.meta.compression_level,
+                        self.meta.row_group_size,
+                    ),
+                    list(zip(data, self.meta.cache_path)),
+                    self.io_workers,
+                )
         self.logger.debug("Task {}: data has been saved to cache".format(self.meta.name))
-        self.meta.dump_to_file()
+        self.meta.size = sum(p.stat().st_size for p in self.meta.cache_paths)
+        self.meta.hits = 0
+        with self._lock_hash:
+            # with write-behind, the hash may have been computed from data in memory already
+            if self.meta.hash_value is None:
+                self.meta.hash_value = hash_value
+            elif self.meta.nout is not None:
+                self.meta.hash_value = [
+                    h if h is not None else hv for h, hv in zip(self.meta.hash_value, hash_value)
+                ]
+            self._link_lineage()
+            self.meta.dump_to_file()
+        if self.quota is not None:
+            self.quota.add(self.meta, owner=self)
+
+    @property
+    def _memory_key(self) -> str:
+        if self.value_range is not None:
+            return "{}|{}|{}".format(self.meta.meta_path, *self.value_range)
+        return str(self.meta.meta_path)
+
+    def _item_key(self, item: int) -> str:
+        return "{}#{}".format(self._memory_key, item)
 
     def __cached_hash__(self):
         """Get hash of cached data
@@ -292,20 +1997,88 @@ class CachedResult:
         Used to construct a cache file name
         """
 
-        # Hash may not be required, so it's not automatically computed from data
+        if self.meta.partitions is not None:
+            # partitions are never rewritten: their hashes identify the data of the range
+            key = [_encode_bound(b) for b in self.value_range]
+            key += [p[2] for _, p in self._overlapping_partitions()]
+            return str(xxhash.xxh64_intdigest(json.dumps(key), seed=HASH_SEED))
+        if self.meta.nout is not None:
+            return [self.item_hash(i) for i in range(self.meta.nout)]
+        # Hash is computed on dump; meta files written by older versions may lack it
         if self.meta.hash_value is None:
             with self._lock_hash:
-                cache_obj = self.load()  # activates _lock_dump_load
-                if self.meta.nout is None:
+                if self.meta.hash_value is None:
+                    cache_obj = self.load()  # activates _lock_dump_load
                     self.meta.hash_value = _hash_obj(cache_obj)
-                else:
-                    self.meta.hash_value = tuple(_hash_obj(co) for co in cache_obj)
-                self.meta.dump_to_file()
-            self.logger.debug("Task {}: hash has been computed from data".format(self.meta.name))
+                    # a pending background write saves the hash together with the data
+                    if not self.is_writing():
+                        self.meta.dump_to_file()
+                    self.logger.debug(
+                        "Task {}: hash has been computed from data".format(self.meta.name)
+                    )
         return self.meta.hash_value
 
+    def item_hash(self, item: int) -> str:
+        """Get hash of one output of a function with multiple outputs"""
+        hash_value = self.meta.hash_value
+        if hash_value is None or hash_value[item] is None:
+            with self._lock_hash:
+                if self.meta.hash_value is None:
+                    self.meta.hash_value = [None] * self.meta.nout
+                if self.meta.hash_value[item] is None:
+                    self.meta.hash_value[item] = _hash_obj(self.load_item(item))
+                    if not self.is_writing():
+                        self.meta.dump_to_file()
+                    self.logger.debug(
+                        "Task {}: hash of output {} has been computed from data".format(
+                            self.meta.name, item
+                        )
+                    )
+        return self.meta.hash_value[item]
+
+    def _link_lineage(self) -> bool:
+        """Save the alias lineage key -> cache name (used by `delayed_compute` to prune graphs)
+
+        :return: true if meta data has changed
+        """
+        if not self.lineage_alias or self.lineage is None or self.meta.lineage == self.lineage:
+            return False
+        _write_lineage(self.meta.folder, self.lineage, self.meta.shard_levels, self.meta.name)
+        self.meta.lineage = self.lineage
+        return True
+
+    def record_lineage(self) -> None:
+        """Link the lineage key of this call to an existing cache"""
+        with self._lock_hash:
+            if self._link_lineage() and not self.is_writing():
+                self.meta.dump_to_file()
+
+    def is_writing(self) -> bool:
+        """True if a background write of this result is not finished yet"""
+        return self._pending_write is not None and not self._pending_write.done()
+
     def exists(self):
-        return self.meta.meta_path.exists()
+        return self.is_writing() or self.meta.exists()
+
+    def reload_meta(self) -> bool:
+        """Re-read meta data from the catalog or file
+
+        :return: true if the cache exists
+        """
+        try:
+            self.meta = CacheMeta.from_file(
+                folder=self.meta.folder,
+                name=self.meta.name,
+                catalog=self.meta._catalog,
+                shard_levels=self.meta.shard_levels,
+            )
+        except FileNotFoundError:
+            return False
+        return True
+
+    def lock(self, timeout: Optional[float] = None) -> FileLock:
+        """Inter-process lock guarding the computation of this result"""
+        return FileLock(self.meta.lock_path, timeout=timeout)
 
 
 class CachedResultItem:
@@ -318,11 +2091,20 @@ class CachedResultItem:
         self.result = result
         self.item = item
 
-    def load(self) -> Any:
+    def load(self, columns: Optional[list[str]] = None, filters: Optional[list] = None) -> Any:
+        """Load data from cache
+
+        :param columns: load only these columns ('parquet' and 'arrow' caches)
+        :param filters: load only rows matching these filters ('parquet' and 'arrow' caches)
+            in the `pyarrow.parquet` format, e.g. `[("date", ">=", start), ("date", "<", end)]`;
+            with 'parquet', row groups are skipped based on column statistics
+        """
+        if columns is not None or filters is not None:
+            return self.result.load_subset(columns=columns, filters=filters, item=self.item)
         if self.item is None:
             return self.result.load()
         else:
-            return self.result.load()[self.item]
+            return self.result.load_item(self.item)
 
     def dump(self, data):
         self.result.dump(data)
@@ -331,7 +2113,184 @@ class CachedResultItem:
         if self.item is None:
             return self.result.__cached_hash__()
         else:
-            return self.result.__cached_hash__()[self.item]
+            return self.result.item_hash(self.item)
+
+    def __cached_lineage__(self) -> str:
+        if self.result.lineage is None:
+            return self.__cached_hash__()
+        return _item_lineage(self.result.lineage, self.item)
+
+
+def _max_rss() -> Optional[int]:
+    """Peak resident memory of this process in bytes (none if not available)"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024  # kilobytes on linux
+
+
+def _current_rss() -> Optional[int]:
+    """Resident memory of this process in bytes (none if not available, e.g. not on linux)"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class _MemoryTracker:
+    """Measure the peak increase of resident memory while a function runs
+
+    Resident memory is sampled on a helper thread; the process peak (`getrusage`) catches
+    spikes between samples once it is exceeded. Memory of other threads running
+    at the same time is included. `peak_memory` is none where resident memory is not
+    available (only linux is supported).
+    """
+
+    def __init__(self, interval: float = MEMORY_SAMPLE_SECONDS):
+        self.interval = interval
+        self.peak_memory: Optional[int] = None
+        self._start: Optional[int] = None
+        self._peak = 0
+        self._max_rss: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._peak = max(self._peak, _current_rss() or 0)
+
+    def __enter__(self) -> _MemoryTracker:
+        self._start = _current_rss()
+        if self._start is not None:
+            self._peak = self._start
+            self._max_rss = _max_rss()
+            self._thread = threading.Thread(target=self._sample, name="dutil-memory", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        peak = max(self._peak, _current_rss() or 0)
+        max_rss = _max_rss()
+        if max_rss is not None and self._max_rss is not None and max_rss > self._max_rss:
+            peak = max(peak, max_rss)  # the process peak has been reached during the call
+        self.peak_memory = peak - self._start
+
+
+def _timed_chunks(chunks: Iterable, meta: CacheMeta) -> Iterator:
+    """Yield chunks and record the time / memory spent producing them in meta data"""
+    meta.compute_time = 0.0
+    it = iter(chunks)
+    with _MemoryTracker() as tracker:
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(it)
+            except StopIteration:
+                break
+            finally:
+                meta.compute_time += time.perf_counter() - start
+            yield chunk
+    meta.peak_memory = tracker.peak_memory
+
+
+def _find_last_meta(
+    folder: Union[Path, str],
+    function: str,
+    catalog: Optional[CacheCatalog] = None,
+    shard_levels: int = 0,
+) -> Optional[CacheMeta]:
+    """Get meta data of the most recently used cache of a function (see `_function_id`)
+
+    Cache names starting with the function id are candidates, the function is matched
+    on the meta data field (e.g. `load` does not match caches of `load_data`).
+    """
+
+    def match(name: str) -> bool:
+        return name.startswith(function)
+
+    folder = Path(folder).absolute()
+    candidates = {}  # name -> last access time
+    if catalog is not None:
+        candidates.update((e[0], e[2]) for e in catalog.entries() if match(e[0]))
+    for path in folder.glob("*/" * shard_levels + "*.meta"):
+        if match(path.stem):
+            try:
+                candidates.setdefault(path.stem, path.stat().st_mtime)
+            except FileNotFoundError:
+                pass
+    for name in sorted(candidates, key=candidates.get, reverse=True):
+        try:
+            meta = CacheMeta.from_file(folder, name, catalog=catalog, shard_levels=shard_levels)
+        except FileNotFoundError:
+            continue
+        if meta.function == function:
+            return meta
+    return None
+
+
+def _load_args(args: tuple, kwargs: dict, max_workers: int) -> tuple[list, dict]:
+    """Load cached arguments concurrently (other arguments are passed on as they are)"""
+    values = list(args) + list(kwargs.values())
+    cached_idx = [i for i, v in enumerate(values) if isinstance(v, CachedResultItem)]
+    loaded = _map_io(lambda i: values[i].load(), cached_idx, max_workers)
+    for i, value in zip(cached_idx, loaded):
+        values[i] = value
+    return values[: len(args)], dict(zip(kwargs, values[len(args) :]))
+
+
+def _call_incremental(
+    result: CachedResult,
+    foo: Callable,
+    args: tuple,
+    kwargs: dict,
+    range_args: tuple[str, str],
+    override: bool,
+    lock: bool,
+    lock_timeout: Optional[float],
+    logger,
+) -> None:
+    """Compute and save sub-ranges missing in an incremental cache"""
+    if not override and not result.missing_ranges():
+        logger.info("Task {}: skip (cache covers the range)".format(result.meta.name))
+        return
+    file_lock = result.lock(timeout=lock_timeout) if lock else None
+    if file_lock is not None:
+        file_lock.acquire()
+    try:
+        if override:
+            result.meta.remove_files()
+            result.meta.partitions = []
+            result.drop_loaded()
+        else:
+            result.reload_meta()
+        gaps = result.missing_ranges()
+        args, kwargs = _load_args(args, kwargs, result.io_workers)
+        for gap in gaps:
+            bounds = {k: _range_value(b, kwargs[k]) for k, b in zip(range_args, (gap[0], gap[2]))}
+            result.append(foo(*args, **{**kwargs, **bounds}), gap)
+        logger.info(
+            "Task {}: {} missing range(s) have been computed and saved to cache".format(
+                result.meta.name, len(gaps)
+            )
+        )
+    finally:
+        if file_lock is not None:
+            file_lock.release()
+
+
+def _get_output(result: CachedResult, nout: Optional[int]):
+    if nout is not None:
+        return tuple(CachedResultItem(result, i) for i in range(nout))
+    else:
+        return CachedResultItem(result, None)
 
 
 def cached(
@@ -346,14 +2305,45 @@ def cached(
     nout: Optional[int] = None,
     override: bool = False,
     logger=None,
+    memory_cache: Optional[MemoryCache] = None,
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
+    lock: bool = True,
+    lock_timeout: Optional[float] = None,
+    write_behind: bool = False,
+    max_folder_bytes: Optional[int] = None,
+    eviction: str = "lru",
+    catalog: Union[bool, str, Path] = False,
+    shard_levels: int = 0,
+    row_group_size: Optional[int] = None,
+    sort_by: Optional[Union[str, list[str]]] = None,
+    range_args: Optional[tuple[str, str]] = None,
+    range_column: Optional[str] = None,
+    io_workers: Optional[int] = None,
+    read_ahead: bool = False,
 ):
     """Cache function output on the disk
 
     Features:
-    - Pickle and parquet serialization
+    - Pickle, parquet, memory-mapped arrow (feather v2) and numpy serialization
     - Special treatment for Delayed objects
     - Lazy cache loading
     - Hashing of complex arguments
+    - Optional in-memory tier shared across calls
+    - Configurable compression
+    - Single-flight computation across processes and atomic cache writes
+    - Optional background (write-behind) cache writes
+    - Optional size limit of the cache folder
+    - Optional indexed meta data catalog (SQLite) instead of one meta file per cache
+    - Optional sharded layout of very large cache folders
+    - Concurrent reads / writes of multiple outputs and concurrent loads of cached arguments
+    - Column and row filter pushdown on load: `.load(columns=..., filters=...)`
+    - Incremental (append-only) caching of results over a range, e.g. of dates
+    - Streaming cache of generator functions: chunks are written as they are produced
+      and read back one at a time (`.load()` returns an iterator)
+    - Lineage keys known before computing arguments: `delayed_compute` skips upstream tasks
+      of existing caches
+    - Compute time and peak memory recorded in meta data (execution plans: `explain`)
 
     :param name: name of the cache file
         if none, name is constructed from the function name and args
@@ -366,22 +2356,111 @@ def cached(
         Improtant: kwargs starting with _ (underscore) will be ignored
     :param folder: name of the cache folder
     :param ftype: type of the cache file
-        'pickle' | 'parquet'
+        'pickle' | 'parquet' | 'arrow' | 'npy'
+        'parquet' and 'arrow' files store pandas, pyarrow (Table, RecordBatch) and polars
+        data frames natively; data is loaded as the same type, arrow and polars data
+        without conversion to pandas (zero-copy from memory-mapped 'arrow' files)
+        'arrow' files are memory-mapped on load: numeric columns without nulls
+        are zero-copy read-only views, pages are shared by processes reading the same file
+        'npy' (numpy arrays only) files are loaded as read-only `np.memmap`;
+        with `nout`, each output array is saved to its own file
     :param kwargs_sep: string separating a keyword parameter and its value
     :param override: if true, override the existing cache file
     :param logger: if none, use a new logger
+    :param memory_cache: if given, keep loaded / computed data in this in-memory tier
+        a repeated call with the same cache name does not read the cache file again
+    :param compression: compression codec of cache files
+        'snappy' | 'lz4' | 'zstd' | 'gzip' | 'brotli' | None
+        None: parquet default (snappy), no compression for other file types
+        'arrow' files support only 'lz4' and 'zstd' and are not zero-copy when compressed;
+        'pickle' and 'npy' files are compressed as a stream of blocks
+        (compressed 'npy' files are not memory-mapped)
+    :param compression_level: codec-specific compression level, if none use the default;
+        requires a codec supporting levels (e.g. not the parquet default snappy)
+    :param lock: if true, only one process / thread computes a missing cache
+        (guarded by a lock file in the cache folder), others wait and load the result
+    :param lock_timeout: max seconds to wait for the lock, if none wait forever
+    :param write_behind: if true, return computed data immediately (kept in memory)
+        and save it to cache on a background thread; see `wait_for_writes`
+        (output of generator functions is always written while it is produced)
+    :param max_folder_bytes: if given, limit the total size of cache files in the folder:
+        whole cache entries are evicted after each write until the folder fits the limit
+    :param eviction: which entries to evict first
+        'lru' (least recently used) | 'lfu' (least frequently used)
+    :param catalog: if true, store meta data in one indexed database per cache folder
+        (see `CacheCatalog`) instead of one json file per cache;
+        existing meta files are still read and added to the catalog.
+        If a path, store the database there (e.g. on a local disk if the folder is on NFS).
+        SQLite is not safe on network file systems: do not use a catalog for a folder
+        used from several hosts at the same time.
+        Use the same setting for all functions sharing a folder
+    :param shard_levels: if positive, store cache files in hash-prefixed subfolders
+        (e.g. `folder/3f/a9/` for 2 levels) to keep the number of files per folder small;
+        use the same setting for all functions sharing a folder,
+        see `reshard_cache` to move existing cache files
+    :param row_group_size: max number of rows per parquet row group / arrow record batch
+        smaller row groups make row filters on load more selective
+    :param sort_by: sort data frames by these columns before saving ('parquet' and 'arrow'),
+        so that row filters on these columns skip most row groups
+    :param range_args: names of (start, end) keyword arguments of a function
+        returning a data frame with rows in [start, end] (bounds are included);
+        if given, the cache is incremental: range arguments are not part of the cache name,
+        only sub-ranges missing in the cache are computed and saved as new partitions,
+        and the output is the concatenation of partitions filtered to [start, end].
+        Requires `ftype='parquet'` and `range_column`; bounds must be numbers or dates
+    :param range_column: data frame column with the values matching range arguments
+        (numeric or datetime); rows duplicated at partition boundaries are dropped
+    :param io_workers: max number of files of one cache (outputs with `nout`, partitions)
+        and of cached arguments read / written concurrently, if none use IO_MAX_WORKERS;
+        1 for sequential I/O
+    :param read_ahead: if true, start loading an existing cache on a background thread
+        as soon as the function is called, so that the data is (being) read
+        by the time a consumer calls `.load()`; loaded data is kept in memory
     :return: new function
         output is lazily loaded from cache file if it exists, generated otherwise
         .load() to get data
     """
 
-    logger = logger if logger is not None else _logger
+    logger = logger if logger is not None else _ModuleLogger()
+    if eviction not in ("lru", "lfu"):
+        raise ValueError("eviction {} is not recognized".format(eviction))
+    _check_compression(ftype, compression, compression_level)
+    if not 0 <= shard_levels <= MAX_SHARD_LEVELS:
+        raise ValueError("shard_levels {} is not supported".format(shard_levels))
+    if (row_group_size is not None or sort_by is not None) and ftype not in ("parquet", "arrow"):
+        raise ValueError("row_group_size / sort_by are not supported for ftype {}".format(ftype))
+    if range_args is not None and (range_column is None or ftype != "parquet" or nout is not None):
+        raise ValueError("range_args require range_column, ftype 'parquet' and nout=None")
+
+    catalog_path = catalog if isinstance(catalog, (str, Path)) else None
 
     def decorator(foo):
         """Cache function output on the disk"""
 
+        is_generator = inspect.isgeneratorfunction(foo)
+        if is_generator and (nout is not None or range_args is not None):
+            raise ValueError("generator functions do not support nout and range_args")
+
+        def get_quota(folder_catalog: Optional[CacheCatalog]) -> Optional[_FolderQuota]:
+            if max_folder_bytes is None:
+                return None
+            return _get_folder_quota(
+                folder, max_folder_bytes, eviction, folder_catalog, shard_levels
+            )
+
         @functools.wraps(foo)
         def new_foo(*args, **kwargs):
+            folder_catalog = _get_catalog(folder, catalog_path) if catalog else None
+            value_range = None
+            name_kwargs = kwargs
+            if range_args is not None:
+                missing = [k for k in range_args if k not in kwargs]
+                if missing:
+                    raise ValueError(
+                        "range arguments {} must be passed by keyword".format(missing)
+                    )
+                value_range = tuple(_range_bound(kwargs[k]) for k in range_args)
+                name_kwargs = {k: v for k, v in kwargs.items() if k not in range_args}
             result = CachedResult.from_user(
                 name=name,
                 name_prefix=name_prefix,
@@ -393,45 +2472,172 @@ def cached(
                 kwargs_sep=kwargs_sep,
                 foo=foo,
                 args=args,
-                kwargs=kwargs,
+                kwargs=name_kwargs,
                 logger=logger,
                 nout=nout,
+                memory_cache=memory_cache,
+                compression=compression,
+                compression_level=compression_level,
+                io_workers=io_workers if io_workers is not None else IO_MAX_WORKERS,
+                quota=get_quota(folder_catalog),
+                catalog=folder_catalog,
+                shard_levels=shard_levels,
+                row_group_size=row_group_size,
+                sort_by=sort_by,
+                range_column=range_column,
+                value_range=value_range,
             )
+            if range_args is not None:
+                _call_incremental(
+                    result, foo, args, kwargs, range_args, override, lock, lock_timeout, logger
+                )
+                return _get_output(result, nout)
             if not override and result.exists():
                 # if the result (= cache OR cache + hash) exists, do nothing - just pass it on
                 # the cache will be loaded only if required later
-                if nout is not None:
-                    output = tuple(CachedResultItem(result, i) for i in range(nout))
-                else:
-                    output = CachedResultItem(result, None)
+                output = _get_output(result, nout)
+                if result.quota is not None:
+                    result.quota.touch(result.meta, owner=result)
+                if read_ahead:
+                    result.prefetch()
+                result.record_lineage()
                 logger.info("Task {}: skip (cache exists)".format(result.meta.name))
             else:
                 # if the result does not exist, generate data and save cache
                 dask_args_detected = any(isinstance(a, Delayed) for a in args)
                 dask_kwargs_detected = any(isinstance(v, Delayed) for _, v in kwargs.items())
                 if not dask_args_detected and not dask_kwargs_detected:
-                    # eager load cache for all arguments
-                    args = [a.load() if isinstance(a, CachedResultItem) else a for a in args]
-                    kwargs = {
-                        k: v.load() if isinstance(v, CachedResultItem) else v
-                        for k, v in kwargs.items()
-                    }
-                    data = foo(*args, **kwargs)
-                    result.dump(data)
-                    if nout is not None:
-                        output = tuple(CachedResultItem(result, i) for i in range(nout))
-                    else:
-                        output = CachedResultItem(result, None)
-                    logger.info(
-                        "Task {}: data has been computed and saved to cache".format(
-                            result.meta.name
-                        )
-                    )
+                    file_lock = result.lock(timeout=lock_timeout) if lock else None
+                    if file_lock is not None:
+                        file_lock.acquire()
+                    try:
+                        if not override and result.reload_meta():
+                            # another process / thread has saved the cache while we waited
+                            logger.info(
+                                "Task {}: skip (cache computed concurrently)".format(
+                                    result.meta.name
+                                )
+                            )
+                        else:
+                            # eager load cache for all arguments (concurrently)
+                            args, kwargs = _load_args(args, kwargs, result.io_workers)
+                            start = time.perf_counter()
+                            with _MemoryTracker() as tracker:
+                                data = foo(*args, **kwargs)
+                            if not is_generator:
+                                result.meta.compute_time = time.perf_counter() - start
+                                result.meta.peak_memory = tracker.peak_memory
+                            if is_generator:
+                                # chunks are written as they are produced
+                                result.dump_stream(_timed_chunks(data, result.meta))
+                                logger.info(
+                                    "Task {}: data has been computed and saved to cache".format(
+                                        result.meta.name
+                                    )
+                                )
+                            elif write_behind:
+                                # the lock is released once the data is written
+                                result.dump_async(data, lock=file_lock)
+                                file_lock = None
+                                logger.info(
+                                    "Task {}: data has been computed, saving to cache".format(
+                                        result.meta.name
+                                    )
+                                )
+                            else:
+                                result.dump(data)
+                                logger.info(
+                                    "Task {}: data has been computed and saved to cache".format(
+                                        result.meta.name
+                                    )
+                                )
+                    finally:
+                        if file_lock is not None:
+                            file_lock.release()
+                    output = _get_output(result, nout)
                 else:
                     # if any of the arguments is a Delayed object, return anything
                     output = foo(*args, **kwargs)
             return output
 
+        def resolve_lineage(
+            args: tuple, kwargs: dict, use: bool = True
+        ) -> tuple[str, Optional[str], Any]:
+            """Get the lineage key, the cache name and the output (if the cache exists) of a call
+
+            Nothing is computed: cached arguments are lazy outputs of existing caches
+            (their hashes are in meta data) or lineage placeholders (any other object
+            with `__cached_lineage__`), then the cache name is known only
+            if an alias of the lineage key exists. Used by `delayed_compute` to prune graphs.
+
+            :param use: if false (dry run), do not count a cache hit and do not read ahead
+            """
+            if override:
+                raise _AlwaysComputed("{} is always called".format(foo.__name__))
+            if range_args is not None:
+                raise _LineageUnresolved("{} is always called".format(foo.__name__))
+            name_kwargs = dict(
+                name=name,
+                name_prefix=name_prefix,
+                parameters=parameters,
+                ignore_args=ignore_args,
+                ignore_kwargs=ignore_kwargs,
+                kwargs_sep=kwargs_sep,
+                foo=foo,
+                args=args,
+                kwargs=kwargs,
+            )
+            values = list(args) + list(kwargs.values())
+            if _has_lineage(values):
+                lineage = _get_lineage(**name_kwargs)
+                if any(
+                    hasattr(v, "__cached_lineage__") and not isinstance(v, CachedResultItem)
+                    for v in values
+                ):
+                    cache_name = _read_lineage(folder, lineage, shard_levels)
+                    if cache_name is None:
+                        return lineage, None, None
+                else:
+                    # all cached arguments exist: their hashes are in meta data
+                    cache_name = _get_cache_name(**name_kwargs)
+            else:
+                full_name = _get_cache_name(**name_kwargs, max_name_len=None)
+                lineage, cache_name = _lineage_digest(full_name), _shorten_name(full_name)
+            folder_catalog = _get_catalog(folder, catalog_path) if catalog else None
+            try:
+                meta = CacheMeta.from_file(
+                    folder=folder,
+                    name=cache_name,
+                    catalog=folder_catalog,
+                    shard_levels=shard_levels,
+                )
+            except FileNotFoundError:  # not computed yet, or evicted since the alias was saved
+                return lineage, cache_name, None
+            result = CachedResult(
+                meta=meta,
+                logger=logger,
+                memory_cache=memory_cache,
+                quota=get_quota(folder_catalog),
+                io_workers=io_workers if io_workers is not None else IO_MAX_WORKERS,
+            )
+            result.lineage = lineage
+            if use and result.quota is not None:
+                result.quota.touch(result.meta, owner=result)
+            if use and read_ahead:
+                result.prefetch()
+            return lineage, cache_name, _get_output(result, nout)
+
+        def find_last_meta() -> Optional[CacheMeta]:
+            """Get meta data of the last used cache of this function (any arguments)"""
+            return _find_last_meta(
+                folder,
+                _function_id(name, name_prefix, foo),
+                _get_catalog(folder, catalog_path) if catalog else None,
+                shard_levels,
+            )
+
+        new_foo.resolve_lineage = resolve_lineage
+        new_foo.find_last_meta = find_last_meta
         return new_foo
 
     return decorator
@@ -440,10 +2646,84 @@ def cached(
 def clear_cache(
     folder: Union[str, Path] = "cache",
     ignore_errors: bool = True,
+    catalog_path: Optional[Union[str, Path]] = None,
 ):
     """Clear the cache folder
 
     :param folder: name of the cache folder
+    :param catalog_path: catalog database stored outside the folder (removed as well)
     """
     folder = Path(folder).absolute()
+    _close_catalogs(folder)
+    with _folder_quotas_lock:
+        _folder_quotas.pop(folder, None)
     shutil.rmtree(folder, ignore_errors=ignore_errors)
+    if catalog_path is not None:
+        try:
+            Path(catalog_path).unlink()
+        except FileNotFoundError:
+            if not ignore_errors:
+                raise
+
+
+def reshard_cache(
+    folder: Union[str, Path] = "cache",
+    shard_levels: int = 2,
+    from_shard_levels: int = 0,
+    catalog_path: Optional[Union[str, Path]] = None,
+) -> int:
+    """Move cache files of a folder to another (sharded) layout
+
+    Do not use the folder while it is migrated.
+
+    :param folder: name of the cache folder
+    :param shard_levels: new number of shard levels (see `cached`)
+    :param from_shard_levels: current number of shard levels
+    :param catalog_path: catalog database stored outside the folder (see `cached`)
+    :return: number of moved cache entries
+    """
+    if not 0 <= shard_levels <= MAX_SHARD_LEVELS:
+        raise ValueError("shard_levels {} is not supported".format(shard_levels))
+    folder = Path(folder).absolute()
+    names = {p.stem for p in folder.glob("*/" * from_shard_levels + "*.meta")}
+    if catalog_path is None and (folder / CATALOG_FILE_NAME).exists():
+        catalog_path = folder / CATALOG_FILE_NAME
+    catalog = _get_catalog(folder, catalog_path) if catalog_path is not None else None
+    if catalog is not None:
+        names.update(e[0] for e in catalog.entries())
+    n = 0
+    for name in sorted(names):
+        try:
+            src = CacheMeta.from_file(
+                folder=folder, name=name, catalog=catalog, shard_levels=from_shard_levels
+            )
+        except FileNotFoundError:
+            continue
+        dst = CacheMeta(folder=folder, catalog=catalog, shard_levels=shard_levels, **src.fields)
+        if dst.meta_path == src.meta_path:
+            continue
+        dst.meta_path.parent.mkdir(parents=True, exist_ok=True)
+        for src_path, dst_path in zip(src.cache_paths, dst.cache_paths):
+            if src_path.exists():
+                os.replace(src_path, dst_path)
+        if src.meta_path.exists():
+            os.replace(src.meta_path, dst.meta_path)
+        n += 1
+    # lineage aliases (see `_get_lineage`) are sharded the same way
+    lineage_folder = folder / LINEAGE_DIR_NAME
+    for src_path in list(lineage_folder.glob("*/" * from_shard_levels + "*")):
+        dst_path = _lineage_path(folder, src_path.name, shard_levels)
+        if src_path.is_file() and src_path.suffix != ".tmp" and dst_path != src_path:
+            dst_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(src_path, dst_path)
+    # remove empty shard folders of the old layout
+    for parent in (lineage_folder, folder):
+        for level in range(from_shard_levels, 0, -1):
+            for path in parent.glob("*/" * level):
+                try:
+                    path.rmdir()
+                except OSError:  # not empty
+                    pass
+    with _folder_quotas_lock:
+        _folder_quotas.pop(folder, None)
+    return n
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+CATALOG_FILE_NAME = ".catalog.sqlite"
+CATALOG_TIMEOUT = 60.0  # seconds to wait for a database locked by another process
+_MAX_QUERY_PARAMS = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    name TEXT PRIMARY KEY,
+    fields TEXT NOT NULL,
+    size INTEGER,
+    hash_value TEXT,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE INDEX IF NOT EXISTS entries_hits ON entries (hits, accessed);
+"""
+
+
+class CacheCatalog:
+    """Indexed catalog of cache meta data: one SQLite database per cache folder
+
+    Replaces one `.meta` file per cache entry: lookups, existence checks (incl. bulk)
+    and size accounting are database queries instead of file system calls.
+    Existing `.meta` files are read if an entry is missing in the catalog,
+    use `migrate` to import all of them at once.
+
+    Important! SQLite locking is not reliable on network file systems (e.g. NFS):
+    do not share a catalog between hosts. For a cache folder on a network file system,
+    either use it from one host only (the database may then be stored on a local disk,
+    see `path`), or keep meta files (no catalog) if several hosts use it at the same time:
+    entries of a catalog are invisible to processes using another catalog / meta files.
+
+    :param folder: cache folder
+    :param path: database file, if none `folder/.catalog.sqlite`
+    """
+
+    def __init__(self, folder: Union[Path, str], path: Optional[Union[Path, str]] = None):
+        self.folder = Path(folder).absolute()
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.path = Path(path).absolute() if path is not None else self.folder / CATALOG_FILE_NAME
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.path, timeout=CATALOG_TIMEOUT, check_same_thread=False, isolation_level=None
+        )
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+
+    def get(self, name: str) -> Optional[dict]:
+        """Get meta data fields of a cache entry"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fields FROM entries WHERE name = ?", (name,)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, fields: dict, accessed: Optional[float] = None) -> None:
+        """Add or update a cache entry
+
+        :param fields: meta data fields (incl. name, size, hash_value and hits)
+        :param accessed: last access time, if none use the current time
+        """
+        now = time.time()
+        accessed = accessed if accessed is not None else now
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO entries (name, fields, size, hash_value, created, accessed, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET fields = excluded.fields, "
+                "size = excluded.size, hash_value = excluded.hash_value, "
+                "accessed = excluded.accessed, hits = excluded.hits",
+                (
+                    fields["name"],
+                    json.dumps(fields),
+                    fields.get("size"),
+                    json.dumps(fields.get("hash_value")),
+                    now,
+                    accessed,
+                    fields.get("hits", 0),
+                ),
+            )
+
+    def touch(self, name: str, hits: int) -> None:
+        """Register a cache hit"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE entries SET accessed = ?, hits = ? WHERE name = ?",
+                (time.time(), hits, name),
+            )
+
+    def remove(self, name: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE name = ?", (name,))
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM entries WHERE name = ?", (name,)).fetchone()
+        return row is not None
+
+    def exists_many(self, names: Iterable[str]) -> set[str]:
+        """Get names of existing cache entries among the given ones"""
+        names = list(names)
+        found = set()
+        with self._lock:
+            for i in range(0, len(names), _MAX_QUERY_PARAMS):
+                chunk = names[i : i + _MAX_QUERY_PARAMS]
+                rows = self._conn.execute(
+                    "SELECT name FROM entries WHERE name IN ({})".format(
+                        ",".join("?" * len(chunk))
+                    ),
+                    chunk,
+                ).fetchall()
+                found.update(r[0] for r in rows)
+        return found
+
+    def entries(self) -> list[tuple[str, int, float, int]]:
+        """Get (name, size, last access time, hits) of all cache entries"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT name, COALESCE(size, 0), accessed, hits FROM entries"
+            ).fetchall()
+
+    def total_size(self) -> int:
+        """Get total size of cache files in bytes"""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def migrate(self, remove_meta_files: bool = False) -> int:
+        """Import all `.meta` files of the folder (incl. shard subfolders) into the catalog
+
+        :param remove_meta_files: if true, remove imported `.meta` files
+        :return: number of imported entries
+        """
+        n = 0
+        for meta_path in self.folder.rglob("*.meta"):
+            try:
+                with open(meta_path, "rt") as f:
+                    fields = json.load(f)
+                accessed = meta_path.stat().st_mtime
+            except (FileNotFoundError, ValueError):  # removed or not readable
+                continue
+            if fields.get("size") is None:
+                fields["size"] = _get_size(meta_path.parent, fields)
+            self.put(fields, accessed=accessed)
+            if remove_meta_files:
+                meta_path.unlink(missing_ok=True)
+            n += 1
+        return n
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _get_size(folder: Path, fields: dict) -> int:
+    name, ftype, nout = fields["name"], fields["ftype"], fields.get("nout")
+    if nout is None:
+        paths = [folder / f"{name}.{ftype}"]
+    else:
+        paths = [folder / f"{name}__{i}.{ftype}" for i in range(nout)]
+    return sum(p.stat().st_size for p in paths if p.exists())
+
+
+_catalogs: dict[tuple[Path, Optional[Path], int], CacheCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def _get_catalog(
+    folder: Union[Path, str], path: Optional[Union[Path, str]] = None
+) -> CacheCatalog:
+    """Get the catalog of a folder (one connection per process)
+
+    :param path: database file, if none the default one in the folder
+    """
+    folder = Path(folder).absolute()
+    path = Path(path).absolute() if path is not None else None
+    key = (folder, None if path == folder / CATALOG_FILE_NAME else path, os.getpid())
+    with _catalogs_lock:
+        if key not in _catalogs:
+            _catalogs[key] = CacheCatalog(key[0], key[1])
+        return _catalogs[key]
+
+
+def _close_catalogs(folder: Union[Path, str]) -> None:
+    folder = Path(folder).absolute()
+    with _catalogs_lock:
+        for key in [k for k in _catalogs if k[0] == folder]:
+            catalog = _catalogs.pop(key)
+            if key[2] == os.getpid():
+                catalog.close()
@@ -1,19 +1,54 @@
 import functools
 import multiprocessing
 from contextlib import contextmanager
+from operator import getitem
 from pathlib import Path
-from typing import Any, List, Optional, Union
+from typing import Any, List, Optional, Tuple, Union
 
 import dask
+import pandas as pd
+from dask.base import collections_to_dsk
+from dask.core import get_dependencies, istask, literal, toposort
 from dask.delayed import Delayed
+from dask.optimization import cull
+from dask.utils import apply
+from loguru import logger as _logger
 
-from dutil.pipeline._cached import CachedResultItem, _kw_is_private, cached
+from dutil.pipeline._cached import (
+    CachedResultItem,
+    MemoryCache,
+    _AlwaysComputed,
+    _item_lineage,
+    _kw_is_private,
+    _LineageUnresolved,
+    cached,
+)
+
+
+class _ParameterGetter:
+    """Task function returning the current value of a delayed parameter
+
+    Unlike a lambda, it is recognized (and evaluated) when `delayed_compute` prunes a graph.
+    Pickled as the current value, so graphs serialized for process / distributed workers
+    do not depend on the parameter object.
+    """
+
+    def __init__(self, source, name: str):
+        self.source = source
+        self.name = name
+
+    def __call__(self) -> Any:
+        return self.source._get(self.name)
+
+    def __reduce__(self):
+        return (literal, (self(),))
 
 
 class DelayedParameter:
     """Delayed parameter = a Delayed object that can change the returned value
 
-    Important! Methods `update` and `context` do not work with dask distributed.
+    Values are read when `delayed_compute` is called (or when dask serializes the graph):
+    changes within `context` apply to any scheduler, incl. processes and dask distributed.
 
     :param name: parameter name
     :param value: parameter value
@@ -22,13 +57,16 @@ class DelayedParameter:
     def __init__(self, name, value=None):
         self._name = name
         self._value = value
-        self._delayed = dask.delayed(name=name)(lambda: self._value)()
+        self._delayed = dask.delayed(name=name)(_ParameterGetter(self, name))()
         self._lock_context = multiprocessing.Lock()
 
     def set(self, value) -> None:
         """Permanently change the value of this parameter"""
         self._value = value
 
+    def _get(self, name: str) -> Any:
+        return self._value
+
     def __call__(self) -> Delayed:
         """Get a Delayed object"""
         return self._delayed
@@ -39,14 +77,17 @@ class DelayedParameter:
         with self._lock_context:
             old_value = self._value
             self.set(value)
-            yield
-            self.set(old_value)
+            try:
+                yield
+            finally:
+                self.set(old_value)
 
 
 class DelayedParameters:
     """A dictionary of delayed parameters
 
-    Important! Methods `update` and `context` do not work with dask distributed.
+    Values are read when `delayed_compute` is called (or when dask serializes the graph):
+    changes within `context` apply to any scheduler, incl. processes and dask distributed.
     """
 
     def __init__(self):
@@ -59,7 +100,7 @@ class DelayedParameters:
         if name in self._params:
             raise KeyError(f"Parameter {name} already exists")
         self._params[name] = value
-        self._param_delayed[name] = dask.delayed(name=name)(lambda: self._params[name])()
+        self._param_delayed[name] = dask.delayed(name=name)(_ParameterGetter(self, name))()
         return self._param_delayed[name]
 
     def create_many(self, d: dict) -> None:
@@ -71,6 +112,9 @@ class DelayedParameters:
         """Get parameters as a dictionary (name -> value)"""
         return {k: v for k, v in self._params.items() if not _kw_is_private(k)}
 
+    def _get(self, name: str) -> Any:
+        return self._params[name]
+
     def get_delayed(self, name: str) -> Delayed:
         """Get a Delayed object for the chosen parameter"""
         return self._param_delayed[name]
@@ -92,8 +136,10 @@ class DelayedParameters:
         with self._lock_context:
             old_params = dict(**self._params)
             self.update_many(d)
-            yield
-            self.update_many(old_params)
+            try:
+                yield
+            finally:
+                self.update_many(old_params)
 
 
 def delayed_cached(
@@ -108,6 +154,22 @@ def delayed_cached(
     nout: Optional[int] = None,
     override: bool = False,
     logger=None,
+    memory_cache: Optional[MemoryCache] = None,
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
+    lock: bool = True,
+    lock_timeout: Optional[float] = None,
+    write_behind: bool = False,
+    max_folder_bytes: Optional[int] = None,
+    eviction: str = "lru",
+    catalog: Union[bool, str, Path] = False,
+    shard_levels: int = 0,
+    row_group_size: Optional[int] = None,
+    sort_by: Optional[Union[str, List[str]]] = None,
+    range_args: Optional[Tuple[str, str]] = None,
+    range_column: Optional[str] = None,
+    io_workers: Optional[int] = None,
+    read_ahead: bool = False,
 ):
     """Delayed and cache function output on the disk (dask.delayed + dutil.pipeline.cached)
 
@@ -130,6 +192,22 @@ def delayed_cached(
             nout=nout,
             override=override,
             logger=logger,
+            memory_cache=memory_cache,
+            compression=compression,
+            compression_level=compression_level,
+            lock=lock,
+            lock_timeout=lock_timeout,
+            write_behind=write_behind,
+            max_folder_bytes=max_folder_bytes,
+            eviction=eviction,
+            catalog=catalog,
+            shard_levels=shard_levels,
+            row_group_size=row_group_size,
+            sort_by=sort_by,
+            range_args=range_args,
+            range_column=range_column,
+            io_workers=io_workers,
+            read_ahead=read_ahead,
         )
         @functools.wraps(foo)
         def new_foo(*args, **kwargs):
@@ -140,8 +218,297 @@ def delayed_cached(
     return decorator
 
 
-def delayed_compute(tasks, scheduler="threads") -> tuple:
-    """Compute values of Delayed objects or load it from cache"""
+class _Lineage:
+    """Placeholder of a cached argument that has not been computed (see `_GraphPruner`)"""
+
+    def __init__(self, lineage: str, item: Optional[int] = None):
+        self.lineage = lineage
+        self.item = item
+
+    def __cached_lineage__(self) -> str:
+        return _item_lineage(self.lineage, self.item)
+
+
+def _constant(value):
+    return value
+
+
+class _GraphPruner:
+    """Replace cached tasks whose caches exist by their (lazy) outputs, top-down
+
+    Lineage keys of cached tasks are resolved without computing their dependencies
+    (see `dutil.pipeline._cached._get_lineage`): cached arguments are (lazy) outputs
+    of existing caches, or lineage placeholders if not computed yet; subgraphs needed
+    only by cache hits are then culled. Tasks depending on results of other (not cached) tasks,
+    or on cached results nested in containers, are never pruned.
+
+    :param replace: if false, only resolve cached tasks (all of them)
+    :param use: if false (dry run), do not count cache hits and do not read ahead
+    """
+
+    def __init__(self, dsk: dict, replace: bool = True, use: bool = True):
+        self.dsk = dsk
+        self.replace = replace
+        self.use = use
+        self.n_pruned = 0
+        self.resolved = {}  # key -> (lineage, cache name, output) or exception of a cached task
+        self._visited = set()
+
+    @staticmethod
+    def _parse_call(task) -> Tuple[Any, list, list]:
+        """Get function, args and kwargs items of a task"""
+        if task[0] is apply:
+            func, args = task[1], task[2] if len(task) > 2 else []
+            kwargs = task[3][1] if len(task) > 3 else []
+            return func, args, kwargs
+        return task[0], list(task[1:]), []
+
+    def _is_key(self, x) -> bool:
+        try:
+            return x in self.dsk
+        except TypeError:  # not hashable
+            return False
+
+    def cached_call(self, key):
+        """Get function, args and kwargs items of a cached task (or none)"""
+        task = self.dsk[key]
+        if not istask(task):
+            return None
+        call = self._parse_call(task)
+        if not hasattr(call[0], "resolve_lineage") or not isinstance(call[1], list):
+            return None
+        return call
+
+    def _resolve(self, x, nested: bool = False):
+        """Evaluate an argument without computing cached tasks (lazy outputs or placeholders)"""
+        if self._is_key(x):
+            if self.cached_call(x) is not None:
+                if nested:
+                    raise _LineageUnresolved("cached result in a container")
+                return self._upstream(x)
+            return self._resolve(self.dsk[x], nested)
+        if isinstance(x, list):
+            return [self._resolve(v, True) for v in x]
+        if not istask(x):
+            return x
+        func, args = x[0], x[1:]
+        if func is getitem and self._is_key(args[0]) and self.cached_call(args[0]) is not None:
+            if nested:
+                raise _LineageUnresolved("cached result in a container")
+            return self._upstream(args[0], args[1])
+        if func is getitem or func is _constant:  # outputs of pruned tasks
+            return func(*(self._resolve(a, nested) for a in args))
+        if isinstance(func, (_ParameterGetter, literal)) or func in (dict, list, tuple, set):
+            return func(*(self._resolve(a, True) for a in args))
+        raise _LineageUnresolved("depends on a task that is not cached")
+
+    def resolve(self, key) -> Tuple[str, Optional[str], Any]:
+        """Get lineage key, cache name (or none) and output (if the cache exists) of a task"""
+        if key not in self.resolved:
+            func, args, kwargs = self.cached_call(key)
+            try:
+                args = [self._resolve(a) for a in args]
+                kwargs = {k: self._resolve(v) for k, v in kwargs}
+                self.resolved[key] = func.resolve_lineage(args, kwargs, use=self.use)
+            except _LineageUnresolved as e:
+                self.resolved[key] = e
+        resolved = self.resolved[key]
+        if isinstance(resolved, _LineageUnresolved):
+            raise resolved
+        return resolved
+
+    def _upstream(self, key, item: Optional[int] = None):
+        """Get the lazy output of a cached task if its cache exists, a lineage placeholder if not
+
+        Outputs of existing caches carry the hashes of their data, so that downstream
+        cache names do not depend on lineage aliases saved by earlier runs.
+        """
+        lineage, _, output = self.resolve(key)
+        output = output[item] if item is not None and isinstance(output, tuple) else output
+        if isinstance(output, CachedResultItem):
+            return output
+        return _Lineage(lineage, item)
+
+    def prune(self, key) -> None:
+        stack = [key]
+        while stack:
+            key = stack.pop()
+            if key in self._visited:
+                continue
+            self._visited.add(key)
+            if self.cached_call(key) is not None:
+                try:
+                    output = self.resolve(key)[2]
+                except _LineageUnresolved:
+                    output = None
+                if output is not None and self.replace:
+                    self.dsk[key] = (_constant, output)
+                    self.n_pruned += 1
+                    continue
+            stack.extend(get_dependencies(self.dsk, key))
+
+
+def _bind_parameters(dsk: dict) -> None:
+    """Replace parameter tasks by their current values"""
+    for key, task in dsk.items():
+        if istask(task) and isinstance(task[0], _ParameterGetter):
+            dsk[key] = (literal(task[0]()),)
+
+
+def _prepare_graph(tasks, prune: bool, logger) -> list:
+    """Bind parameter values and cull subgraphs whose consumers are all cache hits
+
+    See `_GraphPruner`.
+    """
+    if not all(isinstance(t, Delayed) for t in tasks):
+        return list(tasks)
+    keys = [t.key for t in tasks]
+    dsk = dict(collections_to_dsk(tasks, optimize_graph=False))
+    _bind_parameters(dsk)
+    if prune:
+        pruner = _GraphPruner(dsk)
+        for key in keys:
+            pruner.prune(key)
+        if pruner.n_pruned > 0:
+            n_tasks = len(dsk)
+            dsk, _ = cull(dsk, keys)
+            logger.info(
+                "Graph: {} cached task(s) found before computing, {} of {} task(s) remain".format(
+                    pruner.n_pruned, len(dsk), n_tasks
+                )
+            )
+    return [Delayed(key, dsk) for key in keys]
+
+
+class ExecutionPlan:
+    """What `delayed_compute` would do, one row per cached task in `nodes` (see `explain`)
+
+    Columns of `nodes`:
+    - task: dask key
+    - function: name of the cached function
+    - cache_name: none if it depends on data computed in the same run
+    - action: 'load' (cache exists) | 'compute' | 'skip' (needed only by existing caches)
+        | 'unknown' (cache name depends on tasks that are not cached)
+    - size: bytes of cache files
+    - compute_time: seconds spent in the function, recorded when the cache was saved
+    - peak_memory: peak increase of resident memory (bytes) during the call,
+        recorded when the cache was saved (none if not measured)
+    - estimated: if true, size / time / memory are from the last call of the function
+        with other arguments (the cache does not exist yet)
+    """
+
+    def __init__(self, nodes: pd.DataFrame, wall_time: float):
+        self.nodes = nodes
+        self.wall_time = wall_time
+
+    def info(self) -> dict:
+        """Get totals: number of tasks per action, I/O volume and estimated time / memory
+
+        Tasks with an unknown action are assumed to be computed. `peak_memory` is the largest
+        peak memory increase of a computed task.
+        """
+        nodes = self.nodes
+        computed = nodes[nodes["action"].isin(["compute", "unknown"])]
+        counts = nodes["action"].value_counts()
+        peak_memory = computed["peak_memory"].max()
+        return {
+            **{a: int(counts.get(a, 0)) for a in ("load", "compute", "skip", "unknown")},
+            "read_bytes": int(nodes.loc[nodes["action"] == "load", "size"].sum()),
+            "write_bytes": int(computed["size"].sum()),
+            "compute_time": float(computed["compute_time"].sum()),
+            "wall_time": self.wall_time,
+            "peak_memory": 0 if pd.isna(peak_memory) else int(peak_memory),
+            "missing_estimates": int(computed["compute_time"].isna().sum()),
+        }
+
+    def __repr__(self) -> str:
+        info = ", ".join("{}={}".format(k, v) for k, v in self.info().items())
+        return "ExecutionPlan({})\n{}".format(info, self.nodes.to_string(index=False))
+
+
+def _plan_row(key, func, resolved, run: bool) -> dict:
+    """Describe a cached task of an execution plan"""
+    row = {"task": key, "function": func.__name__, "cache_name": None, "estimated": False}
+    meta = None
+    if not run:
+        row["action"] = "skip"
+    elif isinstance(resolved, _AlwaysComputed):
+        row["action"] = "compute"
+    elif resolved is None or isinstance(resolved, _LineageUnresolved):
+        row["action"] = "unknown"
+    else:
+        row["cache_name"] = resolved[1]
+        output = resolved[2]
+        if output is not None:
+            row["action"] = "load"
+            meta = (output[0] if isinstance(output, tuple) else output).result.meta
+        else:
+            row["action"] = "compute"
+    if run and meta is None:
+        meta = func.find_last_meta()
+        row["estimated"] = meta is not None
+    row["size"] = meta.size if meta is not None else None
+    row["compute_time"] = getattr(meta, "compute_time", None)
+    row["peak_memory"] = getattr(meta, "peak_memory", None)
+    return row
+
+
+def explain(tasks, prune: bool = True) -> ExecutionPlan:
+    """Get the execution plan of `delayed_compute` without computing or loading anything
+
+    Cache names are resolved top-down as in `delayed_compute`. The wall time is estimated
+    as the longest chain of computed tasks (recorded compute times, loads are not counted),
+    i.e. assuming enough workers.
+
+    :param prune: plan with (default) or without graph pruning, see `delayed_compute`
+    """
+    tasks = [t for t in tasks if isinstance(t, Delayed)]
+    keys = [t.key for t in tasks]
+    dsk = dict(collections_to_dsk(tasks, optimize_graph=False))
+    pruner = _GraphPruner(dict(dsk), replace=prune, use=False)
+    calls = {k: pruner.cached_call(k) for k in toposort(dsk)}
+    calls = {k: call for k, call in calls.items() if call is not None}
+    for key in keys:
+        pruner.prune(key)
+    run_dsk, dependencies = cull(pruner.dsk, keys)
+    rows = [
+        _plan_row(k, call[0], pruner.resolved.get(k), run=k in run_dsk)
+        for k, call in calls.items()
+    ]
+    columns = ["task", "function", "cache_name", "action", "size", "compute_time"]
+    columns += ["peak_memory", "estimated"]
+    nodes = pd.DataFrame(rows, columns=columns).astype(
+        {"size": "float64", "compute_time": "float64", "peak_memory": "float64"}
+    )
+    times = {
+        row["task"]: row["compute_time"] or 0.0
+        for row in rows
+        if row["action"] in ("compute", "unknown")
+    }
+    finish = {}
+    for key in toposort(run_dsk, dependencies=dependencies):
+        finish[key] = times.get(key, 0.0) + max(
+            (finish[d] for d in dependencies[key]), default=0.0
+        )
+    return ExecutionPlan(nodes, wall_time=max(finish.values(), default=0.0))
+
+
+def delayed_compute(
+    tasks, scheduler="threads", prune: bool = True, logger=None, dry_run: bool = False
+) -> Union[tuple, ExecutionPlan]:
+    """Compute values of Delayed objects or load it from cache
+
+    :param scheduler: dask scheduler, e.g. 'threads' | 'processes' | 'sync'
+        | a `dask.distributed.Client`; parameter values are bound to the graph first
+    :param prune: if true, resolve cache names top-down before computing anything:
+        tasks needed only by existing downstream caches are not computed
+        (even if their own caches have been evicted)
+    :param logger: if none, use a new logger
+    :param dry_run: if true, compute nothing and return the execution plan (see `explain`)
+    """
+    if dry_run:
+        return explain(tasks, prune=prune)
+    tasks = _prepare_graph(tasks, prune, logger if logger is not None else _logger)
     results = dask.compute(*tasks, scheduler=scheduler)
     datas = tuple(r.load() if isinstance(r, CachedResultItem) else r for r in results)
     return datas
@@ -0,0 +1,110 @@
+import errno
+import os
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# errors meaning that another process / descriptor holds the lock
+_BUSY_ERRNOS = {errno.EAGAIN, errno.EWOULDBLOCK, errno.EACCES, errno.EDEADLK}
+
+
+def _try_lock(fd: int) -> bool:
+    """Try to lock without blocking
+
+    Other errors (e.g. locks not supported by a network file system) are raised,
+    so that waiting for the lock never turns into an endless retry.
+    """
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError as e:
+        if e.errno in _BUSY_ERRNOS:
+            return False
+        raise
+    return True
+
+
+def _unlock(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+def _is_same_file(fd: int, path: Path) -> bool:
+    try:
+        return os.stat(path).st_ino == os.fstat(fd).st_ino
+    except FileNotFoundError:
+        return False
+
+
+class FileLock:
+    """Exclusive lock on a lock file, shared by processes and threads
+
+    Each `FileLock` object opens its own file descriptor, so two objects
+    with the same path exclude each other within one process as well.
+    The lock file is removed on release.
+
+    :param path: lock file path
+    :param timeout: max seconds to wait for the lock, if none wait forever
+    :param poll_interval: seconds between attempts to acquire the lock
+    """
+
+    def __init__(
+        self,
+        path: Union[Path, str],
+        timeout: Optional[float] = None,
+        poll_interval: float = 0.05,
+    ):
+        self.path = Path(path)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._fd: Optional[int] = None
+
+    def acquire(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        start = time.monotonic()
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+            try:
+                locked = _try_lock(fd)
+            except OSError:
+                os.close(fd)
+                raise
+            if locked:
+                # the previous holder may have removed the file while we were waiting
+                if _is_same_file(fd, self.path):
+                    self._fd = fd
+                    return
+                _unlock(fd)
+            os.close(fd)
+            if self.timeout is not None and time.monotonic() - start > self.timeout:
+                raise TimeoutError(f"Failed to acquire lock in {self.timeout}s: {self.path}")
+            time.sleep(self.poll_interval)
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        try:
+            self.path.unlink()  # while still locked: waiters notice a new file and retry
+        except OSError:  # Windows cannot remove open files
+            pass
+        _unlock(self._fd)
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.release()
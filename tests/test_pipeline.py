@@ -1,20 +1,47 @@
+import dataclasses
 import datetime as dt
+import enum
+import errno
+import gc
+import multiprocessing
+import pickle
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
 from pathlib import Path
 
+import cloudpickle
 import numpy as np
 import pandas as pd
+import pyarrow.parquet
 import pytest
 from dask import delayed
 
 from dutil.pipeline import (
+    CacheCatalog,
     DelayedParameter,
     DelayedParameters,
+    MemoryCache,
+    _cached,
+    _filelock,
     cached,
     clear_cache,
     delayed_cached,
     delayed_compute,
+    explain,
+    register_hasher,
+    reshard_cache,
+    wait_for_writes,
 )
+from dutil.pipeline._cached import (
+    HASH_MEMO_MAX_ITEMS,
+    HASH_MEMO_MIN_SIZE,
+    _hash_memo,
+    _hash_obj,
+    _hash_pandas,
+)
+from dutil.pipeline._filelock import FileLock
 
 CACHE_DIR = Path("cache/temp/")
 EPS = 0.00001
@@ -94,6 +121,17 @@ def _count_cache_files() -> int:
             ),
             "parquet",
         ),
+        (
+            pd.DataFrame(
+                {
+                    "a": [0, 1.0, 3232.22, -1.0, np.nan],
+                    "b": ["a", "b", "c", "ee", "14"],
+                    "c": pd.Categorical(["a", "b", "a", "b", "a"]),
+                    "d": pd.date_range("2018-01-01", periods=5),
+                }
+            ),
+            "arrow",
+        ),
         (
             pd.DataFrame(
                 {
@@ -854,3 +892,1133 @@ def test_delayed_cached_another_cache_dir():
     _ = delayed_compute((r,))
 
     assert (Path(another_cache_dir) / "load_data.pickle").exists()
+
+
+def test_hash_obj_large_object_arrays():
+    arr1 = np.array([f"x{i}" for i in range(5000)], dtype=object)
+    arr2 = arr1.copy()
+    arr2[2500] = "y"
+    assert str(arr1) == str(arr2)  # numpy abbreviates large arrays
+    assert _hash_obj(arr1) != _hash_obj(arr2)
+    assert _hash_obj(pd.Series(arr1)) != _hash_obj(pd.Series(arr2))
+
+
+@pytest.mark.parametrize(
+    "df1, df2",
+    [
+        (pd.DataFrame({"a": [1, 2]}), pd.DataFrame({"b": [1, 2]})),
+        (pd.DataFrame({"a": [1, 2]}), pd.DataFrame({"a": [1.0, 2.0]})),
+        (pd.DataFrame({"a": [1, 2]}), pd.DataFrame({"a": [1, 2]}, index=[1, 2])),
+        (pd.DataFrame({"a": ["x", "y"]}), pd.DataFrame({"a": ["x", "y"]}, dtype="category")),
+        (pd.DataFrame(np.zeros((5000, 3))), pd.DataFrame(np.eye(5000, 3))),
+    ],
+)
+def test_hash_obj_dataframe_labels_dtypes_index(df1, df2):
+    assert _hash_obj(df1) == _hash_obj(df1.copy())
+    assert _hash_obj(df1) != _hash_obj(df2)
+
+
+@pytest.mark.parametrize(
+    "values1, values2",
+    [
+        ([1, 2], ["1", "2"]),
+        ([Decimal("1.0")], ["1.0"]),
+        ([True, "x"], ["True", "x"]),
+        ([[1, 2]], ["[1, 2]"]),
+        ([1, None], ["1", "None"]),
+        # str() of large arrays is abbreviated: differences in the middle are not shown
+        (
+            [np.arange(5000), np.arange(5000)],
+            [np.arange(5000), np.where(np.arange(5000) == 2500, -1, np.arange(5000))],
+        ),
+    ],
+)
+def test_hash_obj_object_element_types(values1, values2):
+    s1, s2 = pd.Series(values1, dtype=object), pd.Series(values2, dtype=object)
+    assert _hash_obj(s1) == _hash_obj(s1.copy())
+    assert _hash_obj(s1) != _hash_obj(s2)
+    assert _hash_obj(s1.to_numpy()) != _hash_obj(s2.to_numpy())
+
+
+def test_hash_obj_memo(monkeypatch):
+    monkeypatch.setattr(_cached, "HASH_MEMO", True)
+    _hash_memo.clear()
+    df = pd.DataFrame(np.random.rand(HASH_MEMO_MIN_SIZE, 2), columns=["a", "b"])
+    h = _hash_obj(df)
+    assert len(_hash_memo) == 1
+    assert _hash_obj(df) == h
+
+    df["a"] = 0.0  # replaced column buffer invalidates the memoized hash
+    h2 = _hash_obj(df)
+    assert h2 != h
+    assert len(_hash_memo) == 1
+
+    del df
+    gc.collect()
+    assert len(_hash_memo) == 0
+
+
+def test_hash_obj_memo_bounded(monkeypatch):
+    monkeypatch.setattr(_cached, "HASH_MEMO", True)
+    _hash_memo.clear()
+    n = HASH_MEMO_MAX_ITEMS + 5
+    arrays = [np.full(HASH_MEMO_MIN_SIZE, i, dtype=np.int16) for i in range(n)]
+    hashes = [_hash_obj(arr) for arr in arrays]
+    assert len(_hash_memo) == HASH_MEMO_MAX_ITEMS
+    assert len(set(hashes)) == len(arrays)
+    _ = _hash_obj(np.arange(10))  # small objects are not memoized
+    assert len(_hash_memo) == HASH_MEMO_MAX_ITEMS
+
+
+def test_hash_obj_memo_disabled():
+    _hash_memo.clear()
+    arr = np.zeros(HASH_MEMO_MIN_SIZE)
+    h = _hash_obj(arr)
+    arr[HASH_MEMO_MIN_SIZE // 2] = 1.0  # in-place edits change the hash
+    assert _hash_obj(arr) != h
+    assert len(_hash_memo) == 0
+
+
+def test_hash_obj_parallel_columns(monkeypatch):
+    df = pd.DataFrame(np.random.rand(1000, 8)).assign(s=["x"] * 1000)
+    h_serial = _hash_pandas(df)
+    monkeypatch.setattr(_cached, "HASH_PARALLEL_MIN_SIZE", 1)
+    assert _hash_pandas(df) == h_serial
+
+
+def test_hash_obj_thread_safe():
+    frames = [pd.DataFrame(np.random.rand(2000, 5)) for _ in range(16)]
+    expected = [_hash_pandas(df) for df in frames]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for _ in range(5):
+            assert list(executor.map(_hash_pandas, frames)) == expected
+
+
+def test_cached_hash_computed_on_dump(monkeypatch):
+    @cached(folder=CACHE_DIR, ftype="parquet")
+    def load_data():
+        return pd.DataFrame({"a": [0, 1, 3], "b": ["x", "y", "z"]})
+
+    @cached(folder=CACHE_DIR, nout=2)
+    def split_data(df):
+        return df.iloc[:1], df.iloc[1:]
+
+    @cached(folder=CACHE_DIR)
+    def process_data(df):
+        return len(df)
+
+    clear_cache(CACHE_DIR)
+    x, y = split_data(load_data())
+    assert process_data(y).load() == 2
+
+    def _fail(*args, **kwargs):
+        raise AssertionError("cache hit chain must not load data")
+
+    monkeypatch.setattr(_cached, "_cached_load", _fail)
+    x, y = split_data(load_data())
+    _ = process_data(y)
+    assert _count_cache_files() == 7
+
+
+def test_memory_cache_lru_eviction():
+    mc = MemoryCache(max_bytes=2000)
+    mc.put("a", np.zeros(100))
+    mc.put("b", np.zeros(100))
+    assert mc.get("a") is not None  # "b" becomes the least recently used
+    mc.put("c", np.zeros(100))
+    assert "b" not in mc
+    assert "a" in mc and "c" in mc
+    mc.put("d", np.zeros(1000))  # larger than the budget
+    assert "d" not in mc
+    assert mc.get("b") is None
+    assert mc.info()["hits"] == 1
+    assert mc.info()["misses"] == 1
+    assert mc.info()["evictions"] == 1
+
+
+def test_cached_memory_cache(monkeypatch):
+    mc = MemoryCache(max_bytes=10**6)
+
+    @cached(folder=CACHE_DIR, ftype="parquet", memory_cache=mc)
+    def load_data():
+        return pd.DataFrame({"a": [0, 1, 3]})
+
+    clear_cache(CACHE_DIR)
+    df = load_data().load()
+
+    def _fail(*args, **kwargs):
+        raise AssertionError("data must be loaded from memory")
+
+    monkeypatch.setattr(_cached, "_cached_load", _fail)
+    pd.testing.assert_frame_equal(load_data().load(), df)
+    assert mc.hits == 1
+    assert len(mc) == 1
+
+
+def test_cached_arrow_zero_copy():
+    @cached(folder=CACHE_DIR, ftype="arrow")
+    def load_data():
+        return pd.DataFrame({"a": np.arange(1000.0), "b": ["x"] * 1000})
+
+    clear_cache(CACHE_DIR)
+    df = load_data().load()
+    loaded = load_data().load()
+    pd.testing.assert_frame_equal(loaded, df)
+    assert not loaded["a"].values.flags.writeable  # a view of the memory-mapped file
+    assert (CACHE_DIR / "load_data.arrow").exists()
+
+
+def test_cached_npy_memory_mapped():
+    @cached(folder=CACHE_DIR, ftype="npy", nout=2)
+    def compute_features():
+        return np.arange(12.0).reshape(3, 4), np.array([1, 2, 3], dtype=np.int32)
+
+    clear_cache(CACHE_DIR)
+    x, y = compute_features()
+    x_expected, y_expected = x.load(), y.load()
+    x, y = compute_features()
+    assert isinstance(x.load(), np.memmap)
+    assert not x.load().flags.writeable
+    np.testing.assert_equal(x.load(), x_expected)
+    np.testing.assert_equal(y.load(), y_expected)
+    assert y.load().dtype == np.int32
+    assert (CACHE_DIR / "compute_features__1.npy").exists()
+
+
+@pytest.mark.parametrize(
+    "ftype, compression, compression_level",
+    [
+        ("pickle", "zstd", 3),
+        ("pickle", "lz4", None),
+        ("pickle", "snappy", None),
+        ("parquet", "zstd", 9),
+        ("parquet", "lz4", None),
+        ("arrow", "zstd", 1),
+        ("arrow", "lz4", None),
+    ],
+)
+def test_cached_compression(ftype, compression, compression_level):
+    data = pd.DataFrame({"a": np.arange(10000) % 7, "b": ["abc", "de"] * 5000})
+
+    @cached(
+        folder=CACHE_DIR,
+        ftype=ftype,
+        compression=compression,
+        compression_level=compression_level,
+    )
+    def load_data():
+        return data
+
+    clear_cache(CACHE_DIR)
+    _ = load_data().load()
+    pd.testing.assert_frame_equal(load_data().load(), data)
+
+
+@pytest.mark.parametrize(
+    "ftype, compression, compression_level",
+    [
+        ("arrow", "snappy", None),
+        ("pickle", "foo", None),
+        ("parquet", "snappy", 3),
+        ("parquet", None, 3),  # default codec (snappy) has no levels
+        ("pickle", None, 3),
+    ],
+)
+def test_cached_compression_not_supported(ftype, compression, compression_level):
+    with pytest.raises(ValueError, match="not supported"):
+        cached(
+            folder=CACHE_DIR,
+            ftype=ftype,
+            compression=compression,
+            compression_level=compression_level,
+        )
+
+
+def test_cached_compression_npy_small_blocks(monkeypatch):
+    monkeypatch.setattr(_cached, "COMPRESSION_BLOCK_SIZE", 1000)
+
+    @cached(folder=CACHE_DIR, ftype="npy", compression="zstd")
+    def compute():
+        return np.arange(10000.0).reshape(100, 100)
+
+    clear_cache(CACHE_DIR)
+    expected = compute().load()
+    np.testing.assert_equal(compute().load(), expected)
+
+
+def test_cached_single_flight_threads():
+    calls = []
+
+    @cached(folder=CACHE_DIR)
+    def compute(x):
+        calls.append(x)
+        time.sleep(0.3)
+        return x + 1
+
+    clear_cache(CACHE_DIR)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: compute(1).load(), range(4)))
+    assert results == [2] * 4
+    assert calls == [1]
+    assert _count_cache_files() == 2  # lock file is removed
+
+
+def _compute_in_process(log_path):
+    @cached(folder=CACHE_DIR)
+    def compute():
+        with open(log_path, "a") as f:
+            f.write("computed\n")
+        time.sleep(0.3)
+        return 42
+
+    assert compute().load() == 42
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="requires fork")
+def test_cached_single_flight_processes(tmp_path):
+    clear_cache(CACHE_DIR)
+    log_path = tmp_path / "log.txt"
+    ctx = multiprocessing.get_context("fork")
+    processes = [ctx.Process(target=_compute_in_process, args=(log_path,)) for _ in range(3)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    assert all(p.exitcode == 0 for p in processes)
+    assert log_path.read_text() == "computed\n"
+
+
+def test_file_lock_timeout(tmp_path):
+    with FileLock(tmp_path / "x.lock"):
+        with pytest.raises(TimeoutError):
+            FileLock(tmp_path / "x.lock", timeout=0.1).acquire()
+    with FileLock(tmp_path / "x.lock", timeout=0.1):
+        pass
+    assert not (tmp_path / "x.lock").exists()
+
+
+@pytest.mark.skipif(_filelock.fcntl is None, reason="requires fcntl")
+def test_file_lock_unsupported(tmp_path, monkeypatch):
+    def flock(fd, operation):
+        raise OSError(errno.ENOLCK, "No locks available")
+
+    monkeypatch.setattr(_filelock.fcntl, "flock", flock)
+    with pytest.raises(OSError, match="No locks available"):
+        FileLock(tmp_path / "x.lock").acquire()
+
+
+def test_cached_write_behind(monkeypatch):
+    save = _cached._cached_save
+
+    def _slow_save(*args, **kwargs):
+        time.sleep(0.5)
+        return save(*args, **kwargs)
+
+    monkeypatch.setattr(_cached, "_cached_save", _slow_save)
+
+    @cached(folder=CACHE_DIR, ftype="parquet", write_behind=True)
+    def load_data():
+        return pd.DataFrame({"a": [0, 1, 3]})
+
+    @cached(folder=CACHE_DIR, write_behind=True)
+    def process_data(df):
+        return len(df)
+
+    clear_cache(CACHE_DIR)
+    start = time.monotonic()
+    df = load_data()
+    n = process_data(df)
+    assert time.monotonic() - start < 0.45
+    assert n.load() == 3
+    assert load_data().result is df.result  # pending write is reused
+
+    wait_for_writes()
+    assert _count_cache_files() == 4
+    assert process_data(load_data()).result.meta.name == n.result.meta.name
+
+
+def test_cached_write_behind_error():
+    @cached(folder=CACHE_DIR, ftype="parquet", write_behind=True)
+    def load_data():
+        return [1, 2, 3]  # not a DataFrame
+
+    clear_cache(CACHE_DIR)
+    assert load_data().load() == [1, 2, 3]
+    with pytest.raises(AttributeError):
+        wait_for_writes()
+    assert not (CACHE_DIR / "load_data.meta").exists()
+
+
+@pytest.mark.parametrize(
+    "eviction, evicted, catalog", [("lru", "a", False), ("lfu", "b", False), ("lfu", "b", True)]
+)
+def test_cached_max_folder_bytes(eviction, evicted, catalog):
+    clear_cache(CACHE_DIR)
+    _cached._folder_quotas.clear()
+
+    @cached(
+        folder=CACHE_DIR,
+        ftype="npy",
+        max_folder_bytes=25_000,
+        eviction=eviction,
+        catalog=catalog,
+    )
+    def compute(name):
+        return np.zeros(1000)  # ~8 KB
+
+    def remaining():
+        if catalog:
+            return {e[0] for e in CacheCatalog(CACHE_DIR).entries()}
+        return {p.stem for p in CACHE_DIR.glob("*.meta")}
+
+    _ = compute("a")
+    _ = compute("b")
+    _ = compute("c")
+    _ = compute("a")  # cache hits
+    _ = compute("a")
+    _ = compute("b")
+    _ = compute("c")
+    _ = compute("d")  # one entry is evicted
+    assert remaining() == {"compute_a", "compute_b", "compute_c", "compute_d"} - {
+        f"compute_{evicted}"
+    }
+    assert len(list(CACHE_DIR.glob("*.npy"))) == 3
+
+    _cached._folder_quotas.clear()  # a new process reads sizes and stats from meta data
+    _ = compute("e")
+    assert len(remaining()) == 3
+
+
+def test_cached_max_folder_bytes_keeps_used_entries():
+    clear_cache(CACHE_DIR)
+    _cached._folder_quotas.clear()
+
+    @cached(folder=CACHE_DIR, ftype="npy", max_folder_bytes=20_000)
+    def arr(i):
+        return np.full(1000, i)  # ~8 KB
+
+    _ = arr(1)
+    a = arr(1)  # cache hit, not loaded yet
+    _ = arr(2)
+    _ = arr(3)
+    _ = arr(4)
+    assert (a.load() == 1).all()
+    del a
+    _ = arr(5)  # released entries are evicted again
+    assert len(list(CACHE_DIR.glob("*.npy"))) == 2
+
+
+def test_cached_catalog():
+    clear_cache(CACHE_DIR)
+    n_calls = 0
+
+    @cached(folder=CACHE_DIR, catalog=True)
+    def compute(x):
+        nonlocal n_calls
+        n_calls += 1
+        return x * 2
+
+    assert compute(1).load() == 2
+    assert compute(1).load() == 2
+    assert n_calls == 1
+    assert not list(CACHE_DIR.glob("*.meta"))  # meta data is stored in the catalog
+
+    # meta files written without a catalog are read and migrated
+    @cached(folder=CACHE_DIR)
+    def legacy(x):
+        return x * 3
+
+    assert legacy(1).load() == 3
+    assert legacy(2).load() == 6
+    catalog = CacheCatalog(CACHE_DIR)
+    assert catalog.exists_many(["compute_1", "legacy_1", "legacy_2", "other"]) == {"compute_1"}
+    assert catalog.migrate() == 2
+    assert catalog.exists_many(["compute_1", "legacy_1", "legacy_2", "other"]) == {
+        "compute_1",
+        "legacy_1",
+        "legacy_2",
+    }
+    assert catalog.total_size() == sum(p.stat().st_size for p in CACHE_DIR.glob("*.pickle"))
+    assert CacheCatalog(CACHE_DIR).get("compute_1")["hash_value"] is not None
+    catalog.close()
+
+
+def test_cached_catalog_path(tmp_path):
+    clear_cache(CACHE_DIR)
+    path = tmp_path / "local" / "catalog.sqlite"
+    n_calls = 0
+
+    @cached(folder=CACHE_DIR, catalog=path)
+    def compute(x):
+        nonlocal n_calls
+        n_calls += 1
+        return x * 2
+
+    assert compute(1).load() == 2
+    assert cloudpickle.loads(cloudpickle.dumps(compute(1))).load() == 2
+    assert n_calls == 1
+    assert path.exists()
+    assert not (CACHE_DIR / ".catalog.sqlite").exists()
+    assert not list(CACHE_DIR.glob("*.meta"))
+    catalog = CacheCatalog(CACHE_DIR, path)
+    assert catalog.exists_many(["compute_1"]) == {"compute_1"}
+    catalog.close()
+
+    clear_cache(CACHE_DIR, catalog_path=path)
+    assert not path.exists()
+    assert compute(1).load() == 2
+    assert n_calls == 2
+
+
+@pytest.mark.parametrize("catalog", [False, True])
+def test_cached_shard_levels(catalog):
+    clear_cache(CACHE_DIR)
+    n_calls = 0
+
+    def compute(x):
+        nonlocal n_calls
+        n_calls += 1
+        return x * 2
+
+    flat = cached(folder=CACHE_DIR, catalog=catalog)(compute)
+    sharded = cached(folder=CACHE_DIR, catalog=catalog, shard_levels=2)(compute)
+    assert flat(1).load() == 2
+    assert flat(2).load() == 4
+    assert reshard_cache(CACHE_DIR, shard_levels=2) == 2
+    assert not list(CACHE_DIR.glob("*.pickle"))
+    pickles = list(CACHE_DIR.glob("*/*/*.pickle"))
+    assert len(pickles) == 2
+    assert all(len(p.parent.name) == 2 and len(p.parent.parent.name) == 2 for p in pickles)
+    assert sharded(1).load() == 2
+    assert sharded(2).load() == 4
+    assert sharded(3).load() == 6
+    assert n_calls == 3
+    assert len(list(CACHE_DIR.glob("*/*/*.pickle"))) == 3
+
+    assert reshard_cache(CACHE_DIR, shard_levels=0, from_shard_levels=2) == 3
+    assert not [p for p in CACHE_DIR.iterdir() if p.is_dir()]
+    assert flat(3).load() == 6
+    assert n_calls == 3
+
+
+@pytest.mark.parametrize("ftype", ["parquet", "arrow"])
+def test_cached_load_columns_filters(ftype):
+    clear_cache(CACHE_DIR)
+    df = pd.DataFrame({"x": np.arange(1000)[::-1], "y": np.arange(1000) * 2.0, "z": "a"})
+
+    @cached(folder=CACHE_DIR, ftype=ftype, row_group_size=100, sort_by="x")
+    def load_data():
+        return df
+
+    expected = df.sort_values("x", ignore_index=True)
+    pd.testing.assert_frame_equal(load_data().load(), expected)
+    pd.testing.assert_frame_equal(load_data().load(), expected)
+    if ftype == "parquet":
+        metadata = pyarrow.parquet.ParquetFile(CACHE_DIR / "load_data.parquet").metadata
+        assert metadata.num_row_groups == 10
+        assert metadata.row_group(0).column(0).statistics.max == 99
+
+    subset = load_data().load(columns=["x", "y"], filters=[("x", ">=", 100), ("x", "<", 150)])
+    pd.testing.assert_frame_equal(subset, expected.loc[100:149, ["x", "y"]].reset_index(drop=True))
+
+
+def test_cached_load_columns_not_supported():
+    clear_cache(CACHE_DIR)
+
+    @cached(folder=CACHE_DIR)
+    def load_data():
+        return pd.DataFrame({"x": [1, 2]})
+
+    with pytest.raises(ValueError):
+        load_data().load(columns=["x"])
+    with pytest.raises(ValueError):
+        cached(folder=CACHE_DIR, sort_by="x")
+
+
+def test_cached_incremental_range():
+    clear_cache(CACHE_DIR)
+    calls = []
+
+    @cached(folder=CACHE_DIR, ftype="parquet", range_args=("start", "end"), range_column="date")
+    def load_panel(asset, start, end):
+        calls.append((start, end))
+        dates = pd.date_range(start, end, freq="D")
+        return pd.DataFrame({"date": dates, "value": np.arange(len(dates)) + dates.day})
+
+    df = load_panel("a", start=dt.date(2024, 1, 1), end=dt.date(2024, 1, 10)).load()
+    assert len(df) == 10
+    df = load_panel("a", start=dt.date(2024, 1, 1), end=dt.date(2024, 1, 12)).load()
+    assert calls[-1] == (dt.date(2024, 1, 10), dt.date(2024, 1, 12))
+    assert df["date"].is_unique and len(df) == 12
+    # a sub-range is loaded from cache
+    n_calls = len(calls)
+    df = load_panel("a", start=dt.date(2024, 1, 5), end=dt.date(2024, 1, 11)).load()
+    assert len(calls) == n_calls
+    assert df["date"].tolist() == list(pd.date_range("2024-01-05", "2024-01-11"))
+    # missing ranges before and after the cached ones
+    df = load_panel("a", start=dt.date(2023, 12, 30), end=dt.date(2024, 1, 14)).load()
+    assert calls[-2:] == [
+        (dt.date(2023, 12, 30), dt.date(2024, 1, 1)),
+        (dt.date(2024, 1, 12), dt.date(2024, 1, 14)),
+    ]
+    assert df["date"].tolist() == list(pd.date_range("2023-12-30", "2024-01-14"))
+    assert df["value"].notna().all()
+    assert load_panel("a", start="2024-01-02", end="2024-01-03").load(columns=["value"]).shape == (
+        2,
+        1,
+    )
+    # another asset is another cache entry
+    _ = load_panel("b", start=dt.date(2024, 1, 1), end=dt.date(2024, 1, 2))
+    assert calls[-1] == (dt.date(2024, 1, 1), dt.date(2024, 1, 2))
+    assert {p.stem.split("__")[0] for p in CACHE_DIR.glob("*.parquet")} == {
+        "load_panel_a",
+        "load_panel_b",
+    }
+    # downstream caches depend on the requested range only
+    h1 = load_panel("a", start=dt.date(2024, 1, 1), end=dt.date(2024, 1, 3)).__cached_hash__()
+    h2 = load_panel("a", start=dt.date(2024, 1, 1), end=dt.date(2024, 1, 4)).__cached_hash__()
+    _ = load_panel("a", start=dt.date(2024, 1, 1), end=dt.date(2024, 1, 20))
+    assert h1 != h2
+    assert (
+        h1 == load_panel("a", start=dt.date(2024, 1, 1), end=dt.date(2024, 1, 3)).__cached_hash__()
+    )
+
+
+def test_cached_incremental_range_empty_gap():
+    clear_cache(CACHE_DIR)
+    calls = []
+
+    @cached(folder=CACHE_DIR, ftype="parquet", range_args=("start", "end"), range_column="date")
+    def trades(start, end):
+        calls.append((start, end))
+        dates = [d for d in pd.date_range(start, end, freq="D") if d.weekday() < 5]
+        return pd.DataFrame([{"date": d, "x": i} for i, d in enumerate(dates)])
+
+    # weekend only: no rows, no columns
+    assert trades(start="2024-01-06", end="2024-01-07").load().empty
+    assert not list(CACHE_DIR.glob("*.parquet"))
+    df = trades(start="2024-01-04", end="2024-01-09").load()
+    assert df["x"].dtype == np.int64
+    assert len(df) == 4
+    n_calls = len(calls)
+    df = trades(start="2024-01-06", end="2024-01-07").load()
+    assert len(calls) == n_calls  # the empty sub-range is covered
+    assert df.empty and df["x"].dtype == np.int64
+
+
+def test_cached_incremental_range_memory_cache():
+    clear_cache(CACHE_DIR)
+    memory_cache = MemoryCache(max_bytes=10**6)
+    value = 1
+
+    def compute(start, end):
+        return pd.DataFrame({"i": np.arange(start, end + 1), "x": value})
+
+    cache_kwargs = dict(
+        folder=CACHE_DIR,
+        ftype="parquet",
+        range_args=("start", "end"),
+        range_column="i",
+        memory_cache=memory_cache,
+    )
+    assert cached(**cache_kwargs)(compute)(start=0, end=3).load()["x"].tolist() == [1] * 4
+    assert cached(**cache_kwargs)(compute)(start=0, end=1).load()["x"].tolist() == [1] * 2
+    value = 2
+    refreshed = cached(**cache_kwargs, override=True)(compute)
+    assert refreshed(start=0, end=3).load()["x"].tolist() == [2] * 4
+    # other ranges of the overridden cache are not served from memory either
+    assert cached(**cache_kwargs)(compute)(start=0, end=1).load()["x"].tolist() == [2] * 2
+
+
+@pytest.mark.parametrize("ftype", ["parquet", "pickle"])
+def test_cached_generator_streaming(ftype):
+    clear_cache(CACHE_DIR)
+    produced = []
+
+    @cached(folder=CACHE_DIR, ftype=ftype)
+    def load_chunks(n):
+        for i in range(n):
+            produced.append(i)
+            yield pd.DataFrame({"x": np.arange(10) + 10 * i})
+
+    chunks = load_chunks(3).load()
+    assert produced == [0, 1, 2]  # chunks are written on the call
+    assert len(list(CACHE_DIR.glob(f"*__p*.{ftype}"))) == 3
+    assert not isinstance(chunks, list)
+    pd.testing.assert_frame_equal(
+        pd.concat(chunks, ignore_index=True), pd.DataFrame({"x": np.arange(30)})
+    )
+    assert [len(c) for c in load_chunks(3).load()] == [10, 10, 10]
+    assert produced == [0, 1, 2]
+
+    @cached(folder=CACHE_DIR)
+    def total(chunks):
+        return sum(c["x"].sum() for c in chunks)
+
+    assert total(load_chunks(3)).load() == sum(range(30))
+
+    @cached(folder=CACHE_DIR, ftype=ftype, override=True, name="load_chunks_3")
+    def load_fewer_chunks():
+        yield pd.DataFrame({"x": [1]})
+
+    assert len(list(load_fewer_chunks().load())) == 1
+    assert len(list(CACHE_DIR.glob(f"*__p*.{ftype}"))) == 1
+
+
+def test_cached_nout_parallel_io(monkeypatch):
+    clear_cache(CACHE_DIR)
+    barrier = threading.Barrier(3, timeout=10)  # broken unless all 3 files are handled at once
+    save, load = _cached._cached_save, _cached._cached_load
+
+    def save_together(*args, **kwargs):
+        barrier.wait()
+        return save(*args, **kwargs)
+
+    def load_together(*args, **kwargs):
+        barrier.wait()
+        return load(*args, **kwargs)
+
+    monkeypatch.setattr(_cached, "_cached_save", save_together)
+    monkeypatch.setattr(_cached, "_cached_load", load_together)
+
+    @cached(folder=CACHE_DIR, ftype="parquet", nout=3, io_workers=3)
+    def split():
+        return tuple(pd.DataFrame({"x": [i]}) for i in range(3))
+
+    x, y, z = split()
+    assert len(list(CACHE_DIR.glob("*.parquet"))) == 3
+    x, y, z = split()
+    assert [df["x"][0] for df in x.result.load()] == [0, 1, 2]
+
+
+def test_cached_nout_load_item(monkeypatch):
+    clear_cache(CACHE_DIR)
+
+    @cached(folder=CACHE_DIR, nout=3)
+    def split():
+        return [1] * 100, [2] * 100, {"meta": 3}
+
+    _ = split()
+    loaded = []
+    load = _cached._cached_load
+
+    def load_and_record(ftype, path, *args, **kwargs):
+        loaded.append(Path(path).name)
+        return load(ftype, path, *args, **kwargs)
+
+    monkeypatch.setattr(_cached, "_cached_load", load_and_record)
+    _, _, meta = split()
+    assert meta.load() == {"meta": 3}
+    assert meta.load() == {"meta": 3}
+    assert loaded == ["split__2.pickle"]
+
+    @cached(folder=CACHE_DIR)
+    def use_meta(m):
+        return m["meta"]
+
+    assert use_meta(meta).load() == 3
+    assert loaded == ["split__2.pickle"]  # hashes are stored on dump
+    loaded.clear()
+    x, _, _ = split()
+    assert x.result.load() == ([1] * 100, [2] * 100, {"meta": 3})
+    assert sorted(loaded) == ["split__0.pickle", "split__1.pickle", "split__2.pickle"]
+
+
+def test_cached_prefetch_arguments(monkeypatch):
+    clear_cache(CACHE_DIR)
+
+    @cached(folder=CACHE_DIR, ftype="parquet")
+    def load_data(i):
+        return pd.DataFrame({"x": [i]})
+
+    @cached(folder=CACHE_DIR)
+    def join(*dfs, other):
+        return pd.concat(list(dfs) + [other])["x"].sum()
+
+    _ = [load_data(i) for i in range(4)]
+    barrier = threading.Barrier(4, timeout=10)  # broken unless all 4 arguments load at once
+    load = _cached._cached_load
+
+    def load_together(*args, **kwargs):
+        barrier.wait()
+        return load(*args, **kwargs)
+
+    monkeypatch.setattr(_cached, "_cached_load", load_together)
+    assert join(*[load_data(i) for i in range(3)], other=load_data(3)).load() == 6
+
+
+def test_cached_read_ahead(monkeypatch):
+    clear_cache(CACHE_DIR)
+
+    @cached(folder=CACHE_DIR, read_ahead=True)
+    def load_data():
+        return [1, 2, 3]
+
+    _ = load_data()
+    loaded = threading.Event()
+    load = _cached._cached_load
+
+    def load_and_signal(*args, **kwargs):
+        data = load(*args, **kwargs)
+        loaded.set()
+        return data
+
+    monkeypatch.setattr(_cached, "_cached_load", load_and_signal)
+    result = load_data()
+    assert loaded.wait(timeout=10)  # loaded without calling .load()
+    monkeypatch.setattr(_cached, "_cached_load", None)  # data is in memory
+    assert result.load() == [1, 2, 3]
+
+
+@dataclasses.dataclass
+class _Config:
+    window: int
+    assets: list
+
+
+class _Plain:
+    def __init__(self, x):
+        self.x = x
+
+
+class _Color(enum.Enum):
+    RED = 1
+    BLUE = 2
+
+
+def test_hash_obj_structural():
+    assert _hash_obj(1) == "1"  # simple scalars stay readable
+    assert _hash_obj("abc") == "abc"
+    assert _hash_obj(dt.date(2024, 1, 2)) == "2024-01-02"
+    assert _hash_obj({"a": 1, "b": [1, 2]}) == _hash_obj({"b": [1, 2], "a": 1})
+    assert _hash_obj({"a": 1, "b": [1, 2]}) != _hash_obj({"a": 1, "b": [2, 1]})
+    assert _hash_obj({3, 1, 2}) == _hash_obj({2, 3, 1})
+    assert _hash_obj([1, 2]) != _hash_obj((1, 2))
+    assert _hash_obj([1, "1"]) != _hash_obj(["1", 1])
+    assert _hash_obj(_Config(5, ["a"])) == _hash_obj(_Config(5, ["a"]))
+    assert _hash_obj(_Config(5, ["a"])) != _hash_obj(_Config(5, ["b"]))
+    assert _hash_obj(_Plain(1)) == _hash_obj(_Plain(1))  # default repr has a memory address
+    assert _hash_obj(_Plain(1)) != _hash_obj(_Plain(2))
+    assert _hash_obj(_Color.RED) != _hash_obj(_Color.BLUE)
+    assert _hash_obj(np.float32(1)) != _hash_obj(np.float64(1))
+    assert _hash_obj([Path("a"), dt.datetime(2024, 1, 1)]) == _hash_obj(
+        [Path("a"), dt.datetime(2024, 1, 1)]
+    )
+    recursive = [1]
+    recursive.append(recursive)
+    assert _hash_obj(recursive) == _hash_obj(recursive)
+    big = [np.arange(1000)] * 3
+    assert _hash_obj(big) == _hash_obj([np.arange(1000)] * 3)
+    assert _hash_obj(big) != _hash_obj([np.arange(1000)] * 2)
+    assert len(_hash_obj(list(range(100_000)))) <= 32
+
+
+def test_cached_structural_args():
+    clear_cache(CACHE_DIR)
+    n_calls = 0
+
+    @cached(folder=CACHE_DIR)
+    def compute(config, weights):
+        nonlocal n_calls
+        n_calls += 1
+        return config.window * sum(weights.values())
+
+    assert compute(_Config(2, ["a"]), {"a": 1, "b": 2}).load() == 6
+    assert compute(_Config(2, ["a"]), {"b": 2, "a": 1}).load() == 6
+    assert n_calls == 1
+
+
+def test_hash_obj_registered_types():
+    t1 = pyarrow.table({"x": [1, 2, 3], "y": ["a", "b", None]})
+    t2 = pyarrow.table({"x": [1, 2, 4], "y": ["a", "b", None]})
+    assert _hash_obj(t1) == _hash_obj(pyarrow.table({"x": [1, 2, 3], "y": ["a", "b", None]}))
+    assert _hash_obj(t1) != _hash_obj(t2)
+    assert _hash_obj(t1) != _hash_obj(t1.rename_columns(["x", "z"]))
+    assert _hash_obj(t1.to_batches()[0]) != _hash_obj(t2.to_batches()[0])
+    assert _hash_obj(pyarrow.array(["a", "b"]).dictionary_encode()) != _hash_obj(
+        pyarrow.array(["a", "c"]).dictionary_encode()
+    )
+    long_index = pd.Index([f"label_{i}" for i in range(10_000)])
+    assert _hash_obj(long_index) == _hash_obj(long_index.copy())
+    assert _hash_obj(long_index) != _hash_obj(long_index[::-1])
+    assert _hash_obj(pd.Categorical(["a", "b"])) != _hash_obj(pd.Categorical(["a", "b", "c"]))
+    assert _hash_obj(pd.Categorical(["a", "b"])) != _hash_obj(
+        pd.Categorical(["a", "b"], categories=["b", "a"])
+    )
+
+
+class _Custom:
+    def __init__(self, key):
+        self.key = key
+
+    def __repr__(self):
+        raise AssertionError("repr is not used")
+
+
+def test_register_hasher():
+    register_hasher(f"{__name__}._Custom", lambda obj: f"custom{obj.key}")
+    try:
+        assert _hash_obj(_Custom(1)) == "custom1"
+        assert _hash_obj([_Custom(1)]) == _hash_obj([_Custom(1)])
+        assert _hash_obj([_Custom(1)]) != _hash_obj([_Custom(2)])
+        register_hasher(_Custom, lambda obj: f"other{obj.key}")
+        assert _hash_obj(_Custom(1)) == "other1"
+    finally:
+        _cached._hashers.pop(f"{__name__}._Custom")
+        _cached._hashers.pop(_Custom)
+        _cached._hasher_cache.clear()
+
+
+@pytest.mark.parametrize("ftype", ["parquet", "arrow"])
+def test_cached_arrow_native(ftype):
+    clear_cache(CACHE_DIR)
+    table = pyarrow.table({"x": [3, 1, 2], "y": ["c", "a", "b"]})
+
+    @cached(folder=CACHE_DIR, ftype=ftype, nout=2, sort_by="x")
+    def load_data():
+        return table, table.to_batches()[0]
+
+    t, b = load_data()
+    t, b = load_data()
+    assert isinstance(t.load(), pyarrow.Table)
+    assert isinstance(b.load(), pyarrow.RecordBatch)
+    assert t.load().column("x").to_pylist() == [1, 2, 3]
+    assert b.load().equals(table.sort_by("x").to_batches()[0])
+    subset = t.load(columns=["y"], filters=[("x", ">", 1)])
+    assert isinstance(subset, pyarrow.Table)
+    assert subset.column("y").to_pylist() == ["b", "c"]
+
+
+@pytest.mark.parametrize("ftype", ["parquet", "arrow"])
+def test_cached_polars_native(ftype):
+    polars = pytest.importorskip("polars")
+    clear_cache(CACHE_DIR)
+    df = polars.DataFrame({"x": [1, 2, 3], "y": ["a", "b", "c"]})
+
+    @cached(folder=CACHE_DIR, ftype=ftype)
+    def load_data():
+        return df
+
+    _ = load_data()
+    loaded = load_data().load()
+    assert isinstance(loaded, polars.DataFrame)
+    assert loaded.equals(df)
+
+
+def test_delayed_compute_prune():
+    clear_cache(CACHE_DIR)
+    calls = []
+    params = DelayedParameters()
+    n = params.create("n", 3)
+
+    @delayed_cached(folder=CACHE_DIR)
+    def load(n):
+        calls.append("load")
+        return np.arange(n)
+
+    @delayed_cached(folder=CACHE_DIR, nout=2)
+    def split(x, k=1):
+        calls.append("split")
+        return x * k, x + k
+
+    @delayed_cached(folder=CACHE_DIR)
+    def combine(y, z):
+        calls.append("combine")
+        return int(y.sum() + z.sum())
+
+    def pipeline():
+        y, z = split(load(n), k=2)
+        return combine(y, z)
+
+    assert delayed_compute((pipeline(),)) == (15,)
+    assert calls == ["load", "split", "combine"]
+
+    # upstream caches are evicted: only the final cache is loaded
+    for path in CACHE_DIR.glob("load_*"):
+        path.unlink()
+    for path in CACHE_DIR.glob("split_*"):
+        path.unlink()
+    calls.clear()
+    assert delayed_compute((pipeline(),)) == (15,)
+    assert calls == []
+
+    # another parameter value is a new lineage
+    with params.context({"n": 4}):
+        assert delayed_compute((pipeline(),)) == (26,)
+    assert calls == ["load", "split", "combine"]
+
+    calls.clear()
+    assert delayed_compute((pipeline(),), prune=False) == (15,)
+    assert calls == ["load", "split"]
+
+
+def test_delayed_compute_prune_refreshed_upstream():
+    clear_cache(CACHE_DIR)
+    value = 1
+
+    def up():
+        return value
+
+    def down(x):
+        return 100 * x
+
+    up_delayed = delayed_cached(folder=CACHE_DIR)(up)
+    down_delayed = delayed_cached(folder=CACHE_DIR)(down)
+    assert delayed_compute((down_delayed(up_delayed()),)) == (100,)
+
+    # only the upstream cache is refreshed: the downstream cache name follows its data
+    value = 2
+    assert cached(folder=CACHE_DIR, override=True)(up)().load() == 2
+    assert delayed_compute((down_delayed(up_delayed()),)) == (200,)
+    assert delayed_compute((down_delayed(up_delayed()),), prune=False) == (200,)
+
+
+def test_delayed_compute_prune_unknown_dependency():
+    clear_cache(CACHE_DIR)
+    calls = []
+
+    @delayed
+    def load():
+        calls.append("load")
+        return 3
+
+    @delayed_cached(folder=CACHE_DIR)
+    def double(x):
+        calls.append("double")
+        return 2 * x
+
+    assert delayed_compute((double(load()),)) == (6,)
+    calls.clear()
+    # the cache name depends on the output of a task that is not cached
+    assert delayed_compute((double(load()),)) == (6,)
+    assert calls == ["load"]
+
+
+def test_cached_compute_stats():
+    clear_cache(CACHE_DIR)
+
+    @cached(folder=CACHE_DIR)
+    def compute(x):
+        time.sleep(0.1)
+        return x * 2
+
+    @cached(folder=CACHE_DIR)
+    def produce(n):
+        for i in range(n):
+            time.sleep(0.05)
+            yield pd.DataFrame({"a": [i]})
+
+    @cached(folder=CACHE_DIR)
+    def allocate(n):
+        data = np.ones(n, dtype=np.uint8)
+        time.sleep(0.05)
+        return int(data.sum())
+
+    meta = compute(1).result.meta
+    assert 0.1 <= meta.compute_time < 1
+    if _cached._current_rss() is not None:
+        # measured per call, not the peak of the process
+        assert allocate(100 * 2**20).result.meta.peak_memory >= 90 * 2**20
+        assert allocate(2**10).result.meta.peak_memory < 10 * 2**20
+    assert compute(1).result.meta.compute_time == meta.compute_time
+    assert 0.1 <= produce(2).result.meta.compute_time < 1
+
+
+def test_delayed_compute_dry_run():
+    clear_cache(CACHE_DIR)
+    calls = []
+
+    @delayed_cached(folder=CACHE_DIR)
+    def load(n):
+        calls.append("load")
+        time.sleep(0.1)
+        return np.arange(n)
+
+    @delayed_cached(folder=CACHE_DIR)
+    def total(x):
+        calls.append("total")
+        return int(x.sum())
+
+    plan = delayed_compute((total(load(3)),), dry_run=True)
+    assert calls == []
+    assert list(plan.nodes["action"]) == ["compute", "compute"]
+    assert list(plan.nodes["cache_name"]) == ["load_3", None]
+    assert plan.info()["missing_estimates"] == 2
+
+    assert delayed_compute((total(load(3)),)) == (3,)
+    plan = explain((total(load(3)),))
+    assert list(plan.nodes["action"]) == ["skip", "load"]
+    info = plan.info()
+    assert info["load"] == 1 and info["skip"] == 1 and info["compute"] == 0
+    assert info["read_bytes"] > 0 and info["wall_time"] == 0
+
+    # estimates of new calls are from the last call of the function
+    plan = explain((total(load(4)),))
+    assert list(plan.nodes["action"]) == ["compute", "compute"]
+    assert plan.nodes["estimated"].all()
+    info = plan.info()
+    assert info["write_bytes"] > 0 and info["missing_estimates"] == 0
+    assert 0.1 <= info["wall_time"] == info["compute_time"] < 1
+    assert calls == ["load", "total"]
+
+
+def test_explain_estimates_of_function_only():
+    clear_cache(CACHE_DIR)
+
+    @delayed_cached(folder=CACHE_DIR)
+    def load_data(n):
+        return np.arange(n)
+
+    @delayed_cached(folder=CACHE_DIR)
+    def load(n):
+        return np.arange(n)
+
+    assert delayed_compute((load_data(1),))[0].tolist() == [0]
+    # caches of load_data start with "load_" but are not caches of load
+    plan = explain((load(1),))
+    assert list(plan.nodes["action"]) == ["compute"]
+    assert not plan.nodes["estimated"].any()
+    assert plan.nodes["compute_time"].isna().all()
+
+    assert delayed_compute((load(1),))[0].tolist() == [0]
+    assert explain((load(2),)).nodes["estimated"].all()
+
+
+def test_cached_result_pickle():
+    clear_cache(CACHE_DIR)
+    memory_cache = MemoryCache(10**6)
+
+    @cached(folder=CACHE_DIR, nout=2, catalog=True, memory_cache=memory_cache, write_behind=True)
+    def compute(x):
+        return np.arange(x), x
+
+    items = pickle.loads(pickle.dumps(compute(3)))
+    np.testing.assert_array_equal(items[0].load(), np.arange(3))
+    assert items[1].load() == 3
+    assert items[0].result.memory_cache is None
+    assert items[0].__cached_hash__() == compute(3)[0].__cached_hash__()
+    assert isinstance(pickle.loads(pickle.dumps(memory_cache)), MemoryCache)
+    cloudpickle.dumps(compute)  # e.g. sent to process / distributed workers
+
+
+def test_delayed_parameters_processes():
+    clear_cache(CACHE_DIR)
+    params = DelayedParameters()
+    n = params.create("n", 3)
+    k = DelayedParameter("k", value=2)
+
+    @delayed_cached(folder=CACHE_DIR)
+    def load(n):
+        return np.arange(n)
+
+    @delayed_cached(folder=CACHE_DIR)
+    def scale(x, k):
+        return int(x.sum()) * k
+
+    r = scale(load(n), k())
+    assert delayed_compute((r,), scheduler="processes") == (6,)
+    with params.context({"n": 4}), k.context(3):
+        assert delayed_compute((r,), scheduler="processes") == (18,)
+        # parameter values are serialized with the graph
+        assert delayed(lambda x: x)(k()).compute(scheduler="processes") == 3
+    assert delayed_compute((r,), scheduler="processes", prune=False) == (6,)